@@ -0,0 +1,88 @@
+"""
+convert_all 吞吐量基准：在生成的语料上对比
+原来的 ProcessPoolExecutor(20) 逐文件提交方式与 maxpress.batch 批量引擎
+
+    python benchmarks/bench_batch.py [--files 400]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import maxpress
+
+PARAGRAPH = "这是第{i}段正文，包含一些English单词和数字{i}，以及 :smile: 表情。\n\n"
+CODE = "```python\ndef f{i}(x):\n    return x * {i}\n```\n\n"
+
+
+def make_corpus(root, n_files, seed=0):
+    rnd = random.Random(seed)
+    total = 0
+    for i in range(n_files):
+        # 大部分是短文，少数长文
+        n_paragraphs = rnd.choice([3, 5, 8, 12, 40])
+        parts = ["# 文章 {}\n\n".format(i)]
+        for j in range(n_paragraphs):
+            parts.append(PARAGRAPH.format(i=j))
+            if j % 4 == 0:
+                parts.append(CODE.format(i=j))
+        path = os.path.join(root, "doc{:05d}.md".format(i))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        total += os.path.getsize(path)
+    return total
+
+
+def _old_task(p):
+    maxpress.convert_file(*p["args"], **p["kwargs"])
+
+
+def old_convert_all(src, dst):
+    config, styles = maxpress.load_config_and_css(None)
+    ps = [
+        dict(args=(file, path, dst, config, styles), kwargs=dict(title=file[:-3]))
+        for file, path in maxpress.recursive_listdir(src)
+    ]
+    with ProcessPoolExecutor(20) as executor:
+        list(executor.map(_old_task, ps))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=400)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="maxpress-bench-")
+    try:
+        src = os.path.join(tmp, "src")
+        os.makedirs(src)
+        size = make_corpus(src, args.files)
+        print("corpus: {} files, {:.1f} KB, {} CPUs".format(
+            args.files, size / 1024, os.cpu_count()))
+        for name, fn in [
+            ("ProcessPoolExecutor(20), per file", old_convert_all),
+            ("batch engine", lambda s, d: maxpress.convert_all(s, d, archive=False)),
+        ]:
+            dst = os.path.join(tmp, name.split()[0])
+            elapsed = timed(fn, src, dst)
+            print("{:<36} {:.2f}s  {:.1f} docs/s".format(name, elapsed, args.files / elapsed))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
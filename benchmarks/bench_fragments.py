@@ -0,0 +1,81 @@
+"""
+块级渲染缓存基准：在长文档上对比整篇渲染、缓存为空时的首次渲染、
+未修改时的重新渲染，以及修改一段后的重新渲染
+
+    python benchmarks/bench_fragments.py [--size 500] [--repeat 3]
+
+每项取 --repeat 次中最快的一次；每次之前清空高亮、文本和语言判断缓存，
+只保留被测的块级缓存状态。
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import DEFAULT_MIX, make_corpus
+from bench_suite import clear_caches
+from maxpress import fragments
+from maxpress.renderer import mistletoe_parse
+
+
+def best_of(fn, repeat, setup):
+    timings = []
+    for _ in range(repeat):
+        setup()
+        clear_caches()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def edit_one_paragraph(text):
+    middle = len(text) // 2
+    end = text.index("\n\n", middle)
+    return text[:end] + " 修改后的句子。" + text[end:]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=float, default=500, help="document size in KB")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = make_corpus(1, args.size, args.mix, seed=0)[0][1]
+    edited = edit_one_paragraph(text)
+    cache = fragments.fragment_cache
+    print("document: {:.1f} KB".format(len(text.encode("utf-8")) / 1024))
+
+    def disabled():
+        size = cache.maxsize
+        cache.maxsize = 0
+        try:
+            mistletoe_parse(text, convert_list=True)
+        finally:
+            cache.maxsize = size
+
+    def warm():
+        cache.clear()
+        mistletoe_parse(text, convert_list=True)
+
+    baseline = best_of(disabled, args.repeat, cache.clear)
+    results = [
+        ("whole document, no cache", baseline),
+        ("cold cache", best_of(lambda: mistletoe_parse(text, convert_list=True),
+                               args.repeat, cache.clear)),
+        ("unchanged", best_of(lambda: mistletoe_parse(text, convert_list=True),
+                              args.repeat, warm)),
+        ("one paragraph edited", best_of(lambda: mistletoe_parse(edited, convert_list=True),
+                                         args.repeat, warm)),
+    ]
+    for name, elapsed in results:
+        print("{:<28} {:>8.3f}s  {:>6.2f}x".format(name, elapsed, baseline / elapsed))
+
+
+if __name__ == "__main__":
+    main()
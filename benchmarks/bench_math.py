@@ -0,0 +1,80 @@
+"""
+公式预渲染基准：同一批含公式的文档分别以 MathJax 脚本和 MATH_FORMAT 指定的静态格式转换，
+比较耗时、输出大小，以及公式缓存为空和已缓存时的耗时
+
+    python benchmarks/bench_math.py [--docs 50] [--size 8] [--format mathml] [--repeat 3]
+
+MathJax 模式的耗时不包括读者浏览器下载脚本、排版公式的时间。
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import maxpress
+from corpus import make_corpus
+from bench_suite import clear_caches, quiet
+from mistletoe_contrib.static_math import formula_cache
+
+
+def best_of(fn, repeat, setup):
+    timings = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--size", type=float, default=8, help="average document size in KB")
+    parser.add_argument("--mix", default="cjk=4,math=3,code=1,headings=1")
+    parser.add_argument("--format", default="mathml", choices=["mathml", "svg"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    items = [(text, name) for name, text in make_corpus(args.docs, args.size, args.mix, seed=0)]
+    with quiet():
+        converter = maxpress.Converter()
+
+    def render_all():
+        return [converter.render(*item) for item in items]
+
+    def run(fmt, warm):
+        os.environ["MATH_FORMAT"] = fmt
+
+        def setup():
+            # 只保留被测的公式缓存状态
+            clear_caches()
+            if warm:
+                render_all()
+                formulas = list(formula_cache._entries.items())
+                clear_caches()
+                for key, value in formulas:
+                    formula_cache._remember(key, value)
+
+        elapsed = best_of(render_all, args.repeat, setup)
+        return elapsed, sum(map(len, render_all()))
+
+    print("{} docs, {:.1f} KB each".format(args.docs, args.size))
+    baseline, baseline_size = run("", False)
+    results = [
+        ("mathjax script", baseline, baseline_size),
+        ("{}, cold cache".format(args.format),) + run(args.format, False),
+        ("{}, warm cache".format(args.format),) + run(args.format, True),
+    ]
+    for name, elapsed, size in results:
+        print("{:<24} {:>8.3f}s {:>6.2f}x {:>10.1f} KB".format(
+            name, elapsed, baseline / elapsed, size / 1024))
+    print("formula cache:", formula_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
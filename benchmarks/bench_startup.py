@@ -0,0 +1,86 @@
+"""
+启动耗时预算：用 python -X importtime 统计主要入口的累计导入耗时，
+并测量 `python -m maxpress --help` 的总耗时，超出预算时以非零状态码退出
+
+    python benchmarks/bench_startup.py [--repeat 5] [--scale 1.0]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 入口 -> 预算（毫秒）；导入 maxpress 本身不应加载 premailer、lesscpy、mistletoe 等依赖
+IMPORT_BUDGETS = {
+    "maxpress": 60,
+    "maxpress.renderer": 250,
+    "maxpress.server": 150,
+}
+HELP_BUDGET = 300
+HEAVY_MODULES = ("premailer", "requests", "lesscpy", "mistletoe", "pygments", "pangu", "emoji")
+
+
+def run(args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run(
+        [sys.executable] + args, cwd=ROOT, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+
+
+def import_time(module):
+    """
+    返回 (累计导入耗时毫秒, 加载的顶层模块集合)
+    """
+    proc = run(["-X", "importtime", "-c", "import " + module])
+    total = None
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not cumulative.isdigit():
+            continue
+        loaded.add(name.split(".")[0])
+        if name == module:
+            total = int(cumulative) / 1000
+    return total, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply all budgets")
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in IMPORT_BUDGETS.items():
+        budget *= args.scale
+        best, loaded = min(import_time(module) for _ in range(args.repeat))
+        ok = best is not None and best <= budget
+        print("import {:<20} {:7.1f} ms  budget {:5.0f} ms  {}".format(
+            module, best or 0, budget, "ok" if ok else "OVER"))
+        failed |= not ok
+        if module == "maxpress":
+            heavy = sorted(loaded.intersection(HEAVY_MODULES))
+            if heavy:
+                print("  import maxpress loaded: " + ", ".join(heavy))
+                failed = True
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        run(["-m", "maxpress", "--help"])
+        timings.append((time.perf_counter() - start) * 1000)
+    budget = HELP_BUDGET * args.scale
+    ok = min(timings) <= budget
+    print("maxpress --help              {:7.1f} ms  budget {:5.0f} ms  {}".format(
+        min(timings), budget, "ok" if ok else "OVER"))
+    failed |= not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
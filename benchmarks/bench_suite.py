@@ -0,0 +1,200 @@
+"""
+渲染流程基准：在生成的语料上分别测量 mistletoe_parse、pack_html、md2html
+和 convert_all 的吞吐量（docs/s、MB/s）与内存峰值，结果保存为 JSON 以便跨提交比较
+
+    python benchmarks/bench_suite.py [--docs 200] [--size 8] [--mix ...] [--repeat 3]
+                                     [--output result.json] [--compare baseline.json]
+
+每项取 --repeat 次中最快的一次，每次之前清空进程内的块级渲染、高亮、文本和语言判断缓存；
+内存峰值单独运行一次测得，为 tracemalloc 统计的 Python 分配峰值；
+convert_all 启动了工作进程时则为工作进程的最大常驻内存。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import maxpress
+from corpus import DEFAULT_MIX, make_corpus, write_corpus
+
+
+def clear_caches():
+    from maxpress.fragments import fragment_cache
+    from maxpress.renderer import highlight_cache
+    from mistletoe_contrib.lexer_detection import lexer_detector
+    from mistletoe_contrib.static_math import formula_cache
+    from mistletoe_contrib.text_renderer import _transform
+
+    fragment_cache.clear()
+    highlight_cache.clear()
+    lexer_detector.clear()
+    formula_cache.clear()
+    _transform.cache_clear()
+
+
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        yield
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        clear_caches()
+        with quiet():
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def python_peak(fn):
+    clear_caches()
+    tracemalloc.start()
+    try:
+        with quiet():
+            fn()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def batch_peak(fn):
+    """
+    有工作进程时取其最大常驻内存（Linux 上单位为 KB），只在当前进程中转换时同 python_peak
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak = python_peak(fn)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return after if after > before else peak
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    corpus = make_corpus(args.docs, args.size, args.mix, args.seed)
+    n_bytes = sum(len(text.encode("utf-8")) for _, text in corpus)
+    with quiet():
+        config, styles = maxpress.load_config_and_css(None)
+    convert_list = config["convert_list"]
+    # 预热：导入渲染器和内联器，并加载样式表；pack_html 的输入
+    with quiet():
+        maxpress.md2html("", styles=styles)
+        parsed = [(name, maxpress.mistletoe_parse(text, convert_list=convert_list))
+                  for name, text in corpus]
+
+    tmp = tempfile.mkdtemp(prefix="maxpress-bench-")
+    src = os.path.join(tmp, "src")
+    write_corpus(src, corpus)
+
+    def parse():
+        for _, text in corpus:
+            maxpress.mistletoe_parse(text, convert_list=convert_list)
+
+    def pack():
+        for name, html in parsed:
+            maxpress.pack_html(html, name, styles)
+
+    def md2html():
+        for name, text in corpus:
+            maxpress.md2html(text, name, styles, convert_list=convert_list)
+
+    def convert_all():
+        dst = tempfile.mkdtemp(dir=tmp)
+        maxpress.convert_all(src, dst, archive=False, workers=args.workers)
+
+    results = {}
+    try:
+        for name, fn, peak in [
+            ("mistletoe_parse", parse, python_peak),
+            ("pack_html", pack, python_peak),
+            ("md2html", md2html, python_peak),
+            ("convert_all", convert_all, batch_peak),
+        ]:
+            # 先测内存：工作进程的常驻内存只能在第一次启动进程池时区分出来
+            peak_kb = peak(fn)
+            elapsed = best_of(fn, args.repeat)
+            results[name] = {
+                "seconds": round(elapsed, 4),
+                "docs_per_s": round(len(corpus) / elapsed, 2),
+                "mb_per_s": round(n_bytes / elapsed / 2 ** 20, 3),
+                "peak_kb": peak_kb,
+            }
+            print("{:<16} {:>8.3f}s {:>10.1f} docs/s {:>8.2f} MB/s {:>10} KB".format(
+                name, elapsed, results[name]["docs_per_s"],
+                results[name]["mb_per_s"], results[name]["peak_kb"]))
+    finally:
+        shutil.rmtree(tmp)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workers": args.workers,
+            "repeat": args.repeat,
+            "corpus": {"docs": args.docs, "size_kb": args.size, "mix": args.mix,
+                       "seed": args.seed, "bytes": n_bytes},
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    if baseline["meta"]["corpus"] != report["meta"]["corpus"]:
+        print("warning: corpora differ, ratios are not comparable", file=sys.stderr)
+    print("\ncompared with {} ({}):".format(
+        baseline["meta"].get("commit"), baseline["meta"].get("time")))
+    for name, result in report["results"].items():
+        old = baseline["results"].get(name)
+        if old:
+            print("{:<16} {:>6.2f}x throughput  {:>6.2f}x memory".format(
+                name, result["docs_per_s"] / old["docs_per_s"],
+                result["peak_kb"] / max(old["peak_kb"], 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--size", type=float, default=8, help="average document size in KB")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, help="convert_all worker processes")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+raw-text 渲染（emoji + pangu）的微基准：
+逐个 token 无条件转换（原实现）、带前置检查和缓存的逐 token 转换、按段落转换
+
+    python benchmarks/bench_text.py [--copies 20] [--repeat 5]
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pangu
+from mistletoe import Document
+from mistletoe_contrib.text_renderer import TextRenderer, emojize, _transform
+
+
+class UnconditionalTextRenderer(TextRenderer):
+    def render_raw_text(self, token):
+        text = token.content
+        parse = lambda x: pangu.spacing_text(emojize(x))
+        if text.startswith("[ ]"):
+            text = text[3:].strip()
+            rv = '<input disabled="" type="checkbox"> %s\n' % parse(text)
+        elif text.startswith("[x]"):
+            text = text[3:].strip()
+            rv = '<input checked="" disabled="" type="checkbox"> %s\n' % parse(text)
+        else:
+            rv = parse(text)
+        return rv
+
+
+def render(renderer_cls, text, **kw):
+    with renderer_cls(**kw) as renderer:
+        return renderer.render(Document(text))
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        _transform.cache_clear()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "temp", "example.md"), encoding="utf-8") as f:
+        text = f.read() * args.copies
+    # 加入一些英文段落，它们既没有中文也没有 emoji 别名
+    text += "\n\nPlain English paragraph with *emphasis* and `code`.\n" * 200 * args.copies
+    print("document: {:.1f} KB".format(len(text.encode("utf-8")) / 1024))
+
+    cases = [
+        ("per token, unconditional", lambda: render(UnconditionalTextRenderer, text)),
+        ("per token, fast path + memo", lambda: render(TextRenderer, text)),
+        ("per paragraph", lambda: render(TextRenderer, text, per_paragraph=True)),
+    ]
+    baseline = None
+    for name, fn in cases:
+        elapsed = best_of(fn, args.repeat)
+        baseline = baseline or elapsed
+        print("{:<30} {:.3f}s  {:.2f}x".format(name, elapsed, baseline / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+线程池与进程池对比：同一批文档分别用 Converter.render_many（线程池）、
+进程池逐篇 md2html，以及 convert_all 的进程和线程两种批量模式转换，比较耗时并核对结果一致
+
+    python benchmarks/bench_threads.py [--docs 200] [--size 8] [--workers 4] [--repeat 3]
+
+markdown 解析和渲染在线程之间串行，线程池的收益主要来自打包、内联样式和文件读写；
+进程池需要启动工作进程，并在进程之间传递文档和结果。
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import maxpress
+from corpus import DEFAULT_MIX, make_corpus, write_corpus
+from bench_suite import best_of, quiet
+
+_converter = None
+
+
+def _init_process():
+    global _converter
+    with quiet():
+        _converter = maxpress.Converter()
+
+
+def _render(item):
+    return _converter.render(*item)
+
+
+def read_outputs(directory):
+    outputs = {}
+    for file, path in maxpress.recursive_listdir(directory):
+        if file.endswith(".html"):
+            with open(path, encoding="utf-8") as f:
+                outputs[os.path.relpath(path, directory)] = f.read()
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--size", type=float, default=8, help="average document size in KB")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs, args.size, args.mix, seed=0)
+    items = [(text, name) for name, text in corpus]
+    with quiet():
+        converter = maxpress.Converter()
+
+    expected = [converter.render(*item) for item in items]
+    results = {}
+
+    def threads():
+        results["threads"] = converter.render_many(items, workers=args.workers)
+
+    def processes():
+        with ProcessPoolExecutor(args.workers, initializer=_init_process) as executor:
+            results["processes"] = list(executor.map(_render, items, chunksize=8))
+
+    tmp = tempfile.mkdtemp(prefix="maxpress-bench-")
+    src = os.path.join(tmp, "src")
+    write_corpus(src, corpus)
+
+    def convert_all(threaded):
+        def run():
+            dst = os.path.join(tmp, "threads" if threaded else "processes")
+            shutil.rmtree(dst, ignore_errors=True)
+            maxpress.convert_all(src, dst, archive=False, workers=args.workers,
+                                 threads=threaded)
+        return run
+
+    print("{} docs, {:.1f} KB each, {} workers".format(args.docs, args.size, args.workers))
+    try:
+        for name, fn in [
+            ("render: thread pool", threads),
+            ("render: process pool", processes),
+            ("convert_all: threads", convert_all(True)),
+            ("convert_all: processes", convert_all(False)),
+        ]:
+            elapsed = best_of(fn, args.repeat)
+            print("{:<24} {:>8.3f}s {:>10.1f} docs/s".format(name, elapsed, args.docs / elapsed))
+        same = (results["threads"] == expected and results["processes"] == expected
+                and read_outputs(os.path.join(tmp, "threads"))
+                == read_outputs(os.path.join(tmp, "processes")))
+        print("outputs identical:", same)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+目录生成基准：原来的 TOCRenderer（正则去除渲染后标题中的标签，再把目录拼成
+markdown 重新解析、渲染）与单遍生成目录的 TOCRenderer，在标题密集的文档上对比
+
+    python benchmarks/bench_toc.py [--docs 40] [--repeat 5]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mistletoe import Document, block_token
+from mistletoe.html_renderer import HTMLRenderer
+from mistletoe_contrib.toc_renderer import TOCRenderer
+from corpus import make_corpus
+
+
+class OldTOCRenderer(HTMLRenderer):
+    def __init__(self, depth=5, omit_title=True, filter_conds=[], *extras):
+        super().__init__(*extras)
+        self._headings = []
+        self.depth = depth
+        self.omit_title = omit_title
+        self.filter_conds = filter_conds
+
+    @property
+    def toc(self):
+        def get_indent(level):
+            if self.omit_title:
+                level -= 1
+            return ' ' * 4 * (level - 1)
+
+        lines = ['{}- {}\n'.format(get_indent(level), content)
+                 for level, content in self._headings]
+        return block_token.tokenize(lines)[0]
+
+    def render_heading(self, token):
+        template = '<h{level} id="{id}"><a href="{href}">{inner}</a></h{level}>'
+        inner = self.render_inner(token)
+        rendered = template.format(level=token.level, inner=inner, id=inner, href="#" + inner)
+        content = re.sub(r'<.+?>', '', rendered)
+        if not (self.omit_title and token.level == 1
+                or token.level > self.depth
+                or any(cond(content) for cond in self.filter_conds)):
+            self._headings.append((token.level, content))
+        return rendered
+
+
+def render_old(text):
+    doc = Document(text)
+    with OldTOCRenderer() as renderer:
+        body = renderer.render(doc)
+        return renderer.render(renderer.toc) + body
+
+
+def render_new(text):
+    doc = Document(text)
+    with TOCRenderer() as renderer:
+        body = renderer.render(doc)
+        return renderer.render_toc() + body
+
+
+def best_of(fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs, 8, mix="headings=6,cjk=1", seed=0)
+    text = "\n\n".join(text for _, text in corpus)
+    print("document: {:.1f} KB, {} headings".format(
+        len(text.encode("utf-8")) / 1024, len(re.findall(r"^#", text, re.M))))
+    old = best_of(render_old, text, args.repeat)
+    new = best_of(render_new, text, args.repeat)
+    print("{:<32} {:.3f}s".format("regex strip + re-tokenize", old))
+    print("{:<32} {:.3f}s  {:.2f}x".format("single pass", new, old / new))
+
+
+if __name__ == "__main__":
+    main()
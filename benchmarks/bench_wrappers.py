@@ -0,0 +1,79 @@
+"""
+对比两种生成微信列表、图片、表格结构的方式：
+渲染后对整个文档做 fix_li/fix_img/fix_tbl 正则替换，以及 MixRender 在渲染时直接生成
+
+    python benchmarks/bench_wrappers.py [--sections 2000] [--repeat 3]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mistletoe import Document
+from mistletoe_contrib.text_renderer import TextRenderer
+from mistletoe_contrib.mathjax import MathJaxRenderer
+from mistletoe_contrib.pygments_renderer import PygmentsRenderer
+from mistletoe_contrib.toc_renderer import TOCRenderer
+from maxpress.renderer import MixRender, fix_li, fix_img, fix_tbl
+
+SECTION = """
+## Section {i}
+
+Paragraph {i} with an inline image ![inline](http://example.com/{i}.png) and more text.
+
+![figure {i}](http://example.com/figure-{i}.png)
+
+- first item {i}
+- second item {i}
+- third item with ![icon](http://example.com/icon-{i}.png)
+
+| name | value | note |
+| ---- | :---: | ---: |
+| a{i} | 1 | x |
+| b{i} | 2 | y |
+"""
+
+
+class PlainRender(TOCRenderer, PygmentsRenderer, MathJaxRenderer, TextRenderer):
+    pass
+
+
+def regex_pass(text):
+    with PlainRender() as renderer:
+        html = renderer.render(Document(text))
+    return fix_tbl(fix_img(fix_li(html)))
+
+
+def render_pass(text):
+    with MixRender() as renderer:
+        return renderer.render(Document(text))
+
+
+def best_of(fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = "".join(SECTION.format(i=i) for i in range(args.sections))
+    print("document: {:.1f} KB".format(len(text.encode("utf-8")) / 1024))
+    before = best_of(regex_pass, text, args.repeat)
+    after = best_of(render_pass, text, args.repeat)
+    print("render + regex post-pass: {:.3f}s".format(before))
+    print("render with wrappers:     {:.3f}s".format(after))
+    print("speedup: {:.2f}x".format(before / after))
+
+
+if __name__ == "__main__":
+    main()
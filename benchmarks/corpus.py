@@ -0,0 +1,154 @@
+"""
+生成用于基准测试的 markdown 语料，相同参数和种子总是生成相同的内容
+
+    python benchmarks/corpus.py DIR [--docs 200] [--size 8] [--mix cjk=4,code=1,...]
+
+mix 为各类内容块的权重，可用的块见 BLOCKS；文档按 size（KB）上下浮动。
+"""
+import os
+import sys
+import random
+import argparse
+
+CJK_WORDS = ["微信", "公众号", "排版", "样式表", "代码块", "性能", "渲染", "缓存",
+             "文章", "编辑器", "图片", "表格", "标题", "列表", "主题色", "段落"]
+EN_WORDS = ["markdown", "render", "cache", "Python", "CSS", "benchmark", "token",
+            "premailer", "HTML", "latency", "throughput", "worker"]
+EMOJI = [":smile:", ":rocket:", ":thumbsup:", ":fire:", ":tada:", ":sparkles:"]
+LANGUAGES = ["python", "javascript", "bash", "json", "go", "sql"]
+CODE_LINES = {
+    "python": "def f{i}(x):\n    return [y * {i} for y in range(x)]\n",
+    "javascript": "function f{i}(x) {{\n  return x.map(y => y * {i});\n}}\n",
+    "bash": "for f in *.md; do\n  maxpress --src \"$f\" --dst out{i}\ndone\n",
+    "json": "{{\"id\": {i}, \"tags\": [\"a\", \"b\"], \"ok\": true}}\n",
+    "go": "func f{i}(x int) int {{\n\treturn x * {i}\n}}\n",
+    "sql": "SELECT id, title FROM posts WHERE id > {i} ORDER BY id;\n",
+}
+
+
+def _sentence(rnd, cjk=True):
+    words = []
+    for _ in range(rnd.randint(6, 14)):
+        if cjk and rnd.random() < 0.75:
+            words.append(rnd.choice(CJK_WORDS))
+        else:
+            words.append(" " + rnd.choice(EN_WORDS) + " ")
+    return "".join(words).strip() + ("。" if cjk else ".")
+
+
+def cjk(rnd, i):
+    return " ".join(_sentence(rnd) for _ in range(rnd.randint(2, 5))) + "\n\n"
+
+
+def emoji(rnd, i):
+    return "{} {} {}\n\n".format(_sentence(rnd), rnd.choice(EMOJI), _sentence(rnd, cjk=False))
+
+
+def code(rnd, i):
+    language = rnd.choice(LANGUAGES)
+    body = "".join(CODE_LINES[language].format(i=i + k) for k in range(rnd.randint(1, 4)))
+    return "```{}\n{}```\n\n".format(language, body)
+
+
+def code_nolang(rnd, i):
+    language = rnd.choice(LANGUAGES)
+    body = "".join(CODE_LINES[language].format(i=i + k) for k in range(rnd.randint(1, 4)))
+    return "```\n{}```\n\n".format(body)
+
+
+def table(rnd, i):
+    rows = ["| 名称 | 数量 | 说明 |", "| --- | ---: | --- |"]
+    for k in range(rnd.randint(2, 6)):
+        rows.append("| {} | {} | {} |".format(rnd.choice(CJK_WORDS), i * 10 + k, rnd.choice(EN_WORDS)))
+    return "\n".join(rows) + "\n\n"
+
+
+def image(rnd, i):
+    return "![图{0}](https://example.com/images/{0}.png)\n\n".format(i)
+
+
+def math(rnd, i):
+    return "行内公式 $a_{0}^2 + b^2 = c^2$ 与 $\\sum_{{k=1}}^{{{0}}} k$。\n\n$$\\int_0^{{{0}}} x^2 dx$$\n\n".format(i)
+
+
+def headings(rnd, i):
+    parts = []
+    for level in range(2, 7):
+        parts.append("{} {} {}.{}\n\n{}\n\n".format("#" * level, rnd.choice(CJK_WORDS), i, level, _sentence(rnd)))
+    return "".join(parts)
+
+
+BLOCKS = {
+    "cjk": cjk,
+    "emoji": emoji,
+    "code": code,
+    "code_nolang": code_nolang,
+    "table": table,
+    "image": image,
+    "math": math,
+    "headings": headings,
+}
+DEFAULT_MIX = "cjk=6,emoji=2,code=2,code_nolang=1,table=1,image=1,math=1,headings=1"
+
+
+def parse_mix(mix):
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in BLOCKS:
+            raise ValueError("unknown block: {}".format(name))
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def make_document(rnd, index, size_kb, weights):
+    names = list(weights)
+    target = int(size_kb * 1024 * rnd.uniform(0.5, 1.5))
+    parts = ["# 文章 {}\n\n".format(index)]
+    size = len(parts[0].encode("utf-8"))
+    i = 0
+    while size < target:
+        name = rnd.choices(names, weights=[weights[n] for n in names])[0]
+        part = BLOCKS[name](rnd, i)
+        parts.append(part)
+        size += len(part.encode("utf-8"))
+        i += 1
+    return "".join(parts)
+
+
+def make_corpus(docs=200, size_kb=8, mix=DEFAULT_MIX, seed=0):
+    """
+    返回 [(文件名, markdown)] 列表
+    """
+    rnd = random.Random(seed)
+    weights = parse_mix(mix)
+    return [
+        ("doc{:05d}.md".format(i), make_document(rnd, i, size_kb, weights))
+        for i in range(docs)
+    ]
+
+
+def write_corpus(root, corpus):
+    os.makedirs(root, exist_ok=True)
+    total = 0
+    for name, text in corpus:
+        with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+            total += f.write(text)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--size", type=float, default=8, help="average document size in KB")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    corpus = make_corpus(args.docs, args.size, args.mix, args.seed)
+    write_corpus(args.dir, corpus)
+    print("{} files written to {}".format(len(corpus), args.dir), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
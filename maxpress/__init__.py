@@ -1,21 +1,40 @@
 #!/usr/bin/env python3
 import sys
 import argparse
-import os, re, json, shutil
-from concurrent.futures import ProcessPoolExecutor
+import os, re, json, shutil, hashlib, threading, warnings
 from os.path import join as join_path
 
-import premailer
-import requests
-from six import StringIO
-import lesscpy
-from maxpress.renderer import mistletoe_parse
+from maxpress import profiling
+from maxpress.manifest import Manifest, file_digest, fingerprint
+from maxpress.naming import OutputNamer, move_atomic, write_atomic
+
+# premailer、requests、lesscpy、mistletoe、pygments、pangu 等依赖导入较慢，
+# 只在真正用到的地方导入，保证 --help 和命中缓存的转换能快速启动
+_lazy_exports = {
+    "fix_li": "maxpress.renderer",
+    "fix_img": "maxpress.renderer",
+    "fix_tbl": "maxpress.renderer",
+    "get_inliner": "maxpress.inliner",
+    "reset_inliner": "maxpress.inliner",
+    "Converter": "maxpress.converter",
+    "AsyncConverter": "maxpress.aio",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_exports:
+        import importlib
+
+        return getattr(importlib.import_module(_lazy_exports[name]), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 LIB_ROOT = os.getenv("LIB_ROOT") or os.path.dirname(os.path.abspath(__file__))
 # md 根目录
 ROOT = os.getenv("ROOT")
 DEBUG = bool(os.getenv("DEBUG"))
 config_path = os.path.expandvars("$HOME/.config/maxpress/config.json")
+# 编译后的样式表等缓存目录
+CACHE_ROOT = os.getenv("MAXPRESS_CACHE") or os.path.expandvars("$HOME/.cache/maxpress")
 _ = """
 自定义基本参数：
   main_size: 正文主字号
@@ -30,6 +49,7 @@ _ = """
   poster_url: 文章底部图片的url，通常是二维码或宣传海报，如"http://placeholder.qiniudn.com/900x600"
   auto_archive: 是否自动存档（转换后将原始`.md`文件移动至`result／archive`目录下）
   auto_rename: 如何处理冲突的文件名，true - 自动重命名；false - 覆盖先前的文件
+  toc: 是否在文章开头生成目录（可选，默认false）
   border_color: 边框颜色
 """
 # https://www.color-hex.com/color-palette/83148
@@ -58,6 +78,14 @@ default_config = {
     "auto_archive": False,
     "auto_rename": False,
 }
+
+
+def mistletoe_parse(text, toc=False, convert_list=False):
+    from maxpress.renderer import mistletoe_parse
+
+    return mistletoe_parse(text, toc=toc, convert_list=convert_list)
+
+
 export = {"mistletoe": mistletoe_parse}
 
 
@@ -70,10 +98,14 @@ def prepare_dir(path):
         os.makedirs(path)
 
 
-if not os.path.isfile(config_path):
-    prepare_dir(config_path)
-    with open(config_path, "w") as f:
-        f.write(json.dumps(default_config, ensure_ascii=False, indent=2))
+def ensure_config():
+    """
+    首次使用时生成默认配置文件
+    """
+    if not os.path.isfile(config_path):
+        prepare_dir(config_path)
+        with open(config_path, "w") as f:
+            f.write(json.dumps(default_config, ensure_ascii=False, indent=2))
 
 
 def log(*args, **kw):
@@ -105,17 +137,21 @@ def get_compiled_css_path():
     return join_path(LIB_ROOT, "css", "default.css")
 
 
-# 处理配置文件
-def import_config(file=config_path):
+def read_config(file=config_path):
+    if file == config_path:
+        ensure_config()
     with open(file, encoding="utf-8") as json_file:
         text = json_file.read()
         json_text = re.search(r"\{[\s\S]*\}", text).group()  # 去除json文件中的注释
-    config = json.loads(json_text)
+    return json.loads(json_text)
+
 
+def less_variables(config):
     non_style_keys = [
         "poster_url",
         "banner_url",
         "convert_list",
+        "toc",
         "auto_archive",
         "auto_rename",
     ]
@@ -132,29 +168,125 @@ def import_config(file=config_path):
                         "@{}: {};\n".format(inner_key + "_" + key, inner_value)
                     )
 
-    variables = "\n".join(cfg_lines) + "\n\n"
+    return "\n".join(cfg_lines) + "\n\n"
+
+
+# 处理配置文件
+def import_config(file=config_path):
+    """
+    已弃用，改用 read_config：配置变量由 compile_css 在内存中与 styles.less 合并，
+    这里只读取并返回配置，不再写入包目录下的 default.less
+    """
+    warnings.warn("import_config is deprecated, use read_config", DeprecationWarning, stacklevel=2)
+    return read_config(file)
+
 
+def default_less_source(config):
     with open(get_styles_less(), encoding="utf-8") as styles_file:
         styles = styles_file.read()
-    with open(get_default_less_path(), "w", encoding="utf-8") as default_less:
-        default_less.write(variables + styles)
-    return config
+    return less_variables(config) + styles
 
 
-# 解析less文件，生成默认样式表
-def compile_styles(file=get_default_less_path()):
-    with open(file, encoding="utf-8") as raw_file:
-        raw_text = raw_file.read()
+def compile_css(config):
+    """
+    在内存中编译 config 对应的样式表，返回 CSS 文本
+    """
+    import lesscpy
+    from six import StringIO
+
+    return lesscpy.compile(StringIO(default_less_source(config)))
+
+
+def cached_css(config, rebuild_css=False, quiet=False):
+    """
+    返回 config 对应的已编译样式表路径，缓存中没有时编译；quiet 为真时命中缓存不输出日志
+    """
+    css_path = get_cached_css_path(config)
+    if rebuild_css or not os.path.isfile(css_path):
+        log("[+] 正在编译CSS样式表...", end=" ")
+        # 先写临时文件再改名，并发运行时不会读到写了一半的样式表
+        write_atomic(css_path, compile_css(config))
+        log("编译成功")
+    elif not quiet:
+        log("[+] 使用已缓存的CSS样式表")
+    return css_path
+
 
+_default_css = (None, None)
+_default_css_lock = threading.Lock()
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def default_css():
+    """
+    按 config.json 编译的样式表路径，供没有指定样式表的 md2html 使用；
+    进程内按 config.json 和 styles.less 的修改时间记住结果，两者不变时不再读取、也不输出日志
+    """
+    global _default_css
+    ensure_config()
+    less_path = get_styles_less()
+    key = (less_path, _stat_key(config_path), _stat_key(less_path))
+    with _default_css_lock:
+        if _default_css[0] != key:
+            _default_css = (key, cached_css(read_config(), quiet=True))
+        return _default_css[1]
+
+
+# 解析less文件，生成默认样式表
+def compile_styles(file=None, css_path=None):
+    """
+    已弃用，改用 cached_css：file 为 None 时重新编译 config.json 对应的样式表并返回其路径；
+    否则编译 file，写入 css_path，默认写入 CSS 缓存目录，不再写入包目录
+    """
+    warnings.warn("compile_styles is deprecated, use cached_css", DeprecationWarning, stacklevel=2)
+    if file is None and css_path is None:
+        return cached_css(read_config(), rebuild_css=True)
+    import lesscpy
+    from six import StringIO
+
+    if file is None:
+        raw_text = default_less_source(read_config())
+    else:
+        with open(file, encoding="utf-8") as raw_file:
+            raw_text = raw_file.read()
     css = lesscpy.compile(StringIO(raw_text))
-    css_path = get_compiled_css_path()
-    prepare_dir(css_path)
-    with open(css_path, "w", encoding="utf-8") as css_file:
-        css_file.write(css)
+    if not css_path:
+        name = os.path.splitext(os.path.basename(file))[0]
+        css_path = join_path(CACHE_ROOT, "css", name + ".css")
+    # 先写临时文件再改名，避免并发运行时读到写了一半的样式表
+    write_atomic(css_path, css)
+    return css_path
+
+
+def css_cache_key(config):
+    """
+    编译结果只取决于配置变量、styles.less 和 lesscpy 版本
+    """
+    import lesscpy
+
+    with open(get_styles_less(), encoding="utf-8") as styles_file:
+        styles = styles_file.read()
+    digest = hashlib.sha1()
+    for part in (less_variables(config), styles, lesscpy.__version__):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get_cached_css_path(config):
+    return join_path(CACHE_ROOT, "css", css_cache_key(config) + ".css")
 
 
 def embed_css(html):
     import bs4
+    from maxpress.stylesheets import get_loader
 
     soup = bs4.BeautifulSoup(html, features='lxml')
     stylesheets = soup.findAll("link", {"rel": "stylesheet"})
@@ -165,7 +297,7 @@ def embed_css(html):
             if os.path.isfile(href):
                 css = open(href).read()
             else:
-                css = requests.get(href).text
+                css = get_loader().load(href)
             c = bs4.element.NavigableString(css)
             t.insert(0, c)
             t["type"] = "text/css"
@@ -174,44 +306,78 @@ def embed_css(html):
 
 
 # 将待解析的md文档转换为适合微信编辑器的html
-def md2html(text, title="", styles=None, poster="", banner="", convert_list=True):
-    # 将markdown列表转化为带序号的普通段落（纯为适应微信中列表序号样式自动丢失的古怪现象）
-    if convert_list:
-        blocks = text.split("\n```")
-        for i in range(0, len(blocks)):
-            if i % 2 == 0:
-                blocks[i] = re.sub(r"(\n\d+)(\.\s.*?)", r"\n\1\\\2", blocks[i])
-            else:
-                continue  # 跳过代码块内部内容
-        text = "\n```".join(blocks)
+def md2html(
+    text,
+    title="",
+    styles=None,
+    poster="",
+    banner="",
+    convert_list=True,
+    toc=False,
+    workers=None,
+    inliner=None,
+):
+    """
+    inliner 为 None 时使用当前批次共用的内联器；开头的 front matter 只用于选择主题，不输出
+    """
+    from maxpress.themes import split_front_matter
+
+    _, text = split_front_matter(text)
+    if workers and workers > 1:
+        # 大文档分段并行转换，结果与串行转换相同
+        from maxpress import sections
 
+        if len(text) >= sections.SECTION_BYTES:
+            return sections.md2html(
+                text, title, styles, poster, banner, convert_list, toc, workers
+            )
     MD_PARSER = "mistletoe"
     MD = export[MD_PARSER]
-    inner_html = MD(text)
+    if profiling.current():
+        profiling.count("input_bytes", len(text.encode("utf-8")))
+    # 将markdown有序列表转化为带序号的普通段落，在解析后的语法树上完成
+    with profiling.stage("parse"):
+        inner_html = MD(text, toc=toc, convert_list=convert_list)
     if DEBUG:
         with open("1.html", "w") as f:
             f.write(inner_html)
-    packed = pack_html(inner_html, title, styles, poster, banner)
+    with profiling.stage("pack"):
+        packed = pack_html(inner_html, title, styles, poster, banner)
     if DEBUG:
         with open("2.html", "w") as f:
             f.write(packed)
     # return packed
-    result = premailer.transform(packed)
+    # 样式表在批次内只解析一次，结果与 premailer.transform(packed) 相同
+    from maxpress.inliner import get_inliner
+
+    with profiling.stage("inline"):
+        result = (inliner or get_inliner()).transform(packed)
     # result = embed_css(packed)
     if DEBUG:
         with open("3.html", "w") as f:
             f.write(result)
+    if profiling.current():
+        profiling.count("output_bytes", len(result.encode("utf-8")))
     return result
 
 
-def pack_html(html, title="", styles=None, poster="", banner=""):
-    if not styles:
-        styles = [get_compiled_css_path()]
+def page_styles(styles=None):
+    """
+    页面中依次引入的样式表；没有指定时使用按 config.json 编译的样式表
+    """
+    styles = list(styles) if styles else [default_css()]
     if highlight_css:
         styles.append(highlight_css)
     custom_css = get_custom_css_path()
     if custom_css:
         styles.append(custom_css)
+    return styles
+
+
+def pack_html(html, title="", styles=None, poster="", banner=""):
+    from maxpress.renderer import IMG_WRAPPER
+
+    styles = page_styles(styles)
     # log('styles', styles, end='  ')
 
     style_tags = [
@@ -220,12 +386,14 @@ def pack_html(html, title="", styles=None, poster="", banner=""):
     ]
 
     if poster.strip():
-        poster_tag = '\n<br>\n<img src="{}" alt="poster"／>'.format(poster)
+        poster_tag = '\n<br>\n' + IMG_WRAPPER.format(
+            '<img src="{}" alt="poster"／>'.format(poster)
+        )
     else:
         poster_tag = ""
 
     if banner.strip():
-        banner_tag = '<img src="{}" alt="banner"／>'.format(banner)
+        banner_tag = IMG_WRAPPER.format('<img src="{}" alt="banner"／>'.format(banner))
     else:
         banner_tag = ""
 
@@ -248,44 +416,8 @@ def pack_html(html, title="", styles=None, poster="", banner=""):
     )
 
     foot = """{}\n</div>\n</body>\n</html>""".format(poster_tag)
-    html = head + html + foot
-
-    result = fix_tbl(fix_img(fix_li(html)))
-    return result
-
-
-def fix_li(html):
-    """
-    修正粘贴到微信编辑器时列表格式丢失的问题
-    """
-    result = re.sub(
-        r"<li>(.*?)</li>", r"<li><span>\1</span></li>", html, flags=re.MULTILINE
-    )
-    return result
-
-
-def fix_img(html):
-    """
-    修正HTML图片大小自适应问题
-    """
-    result = re.sub(
-        r"(<p>)*?<img([\s\S]*?)>(</p>)*?",
-        r'<section class="img-wrapper"><img\2></section>',
-        html,
-    )
-    return result
-
-
-def fix_tbl(html):
-    """
-    修正HTML表格左右留白问题
-    """
-    result = re.sub(
-        r"<table>([\s\S]*?)</table>",
-        r'<section class="tbl-wrapper"><table>\1</table></section>',
-        html,
-    )
-    return result
+    # 列表、图片、表格的包装已在渲染时完成
+    return head + html + foot
 
 
 # 装饰器：提供报错功能
@@ -298,64 +430,191 @@ def recursive_listdir(dir):
 
 # 用于处理冲突的文件名
 def autoname(defaultpath):
-    try:
-        ext = re.search(r"\.\w+?$", defaultpath).group()
-    except AttributeError:
-        ext = None
-    count = 0
-    while count < 10000:
-        suffix = "(%d)" % count if count > 0 else ""
-        if ext:
-            newpath = defaultpath[: 0 - len(ext)] + suffix + ext
-        else:
-            newpath = defaultpath + suffix
-        if not os.path.exists(newpath):
-            return newpath
-        else:
-            count += 1
-            continue
+    return OutputNamer().assign(defaultpath)
 
 
-def map_do(fn, iterable, n=20):
-    with ProcessPoolExecutor(n) as executor:
-        results = executor.map(fn, iterable)
-        return results
+def output_path(file, filepath, dst):
+    middle_path = os.path.dirname(os.path.relpath(filepath, ROOT)) if ROOT else None
+    if middle_path:
+        return join_path(dst, middle_path, file[:-3] + ".html")
+    return join_path(dst, file[:-3] + ".html")
 
 
-def _map_fn_wrapper(p):
-    convert_file(*p["args"], **p["kwargs"])
+def archive_path(file):
+    return join_path(LIB_ROOT, "result", "archive", file)
 
 
-def convert_all(src=join_path(LIB_ROOT, "temp"), dst=None, archive=None, styles=None):
+def build_fingerprint(config, styles):
+    """
+    影响所有文档输出的全局输入，任何一项变化都会使增量构建全部失效
+    """
+    parts = [json.dumps(config, sort_keys=True)]
+    for path in [get_styles_less(), get_custom_css_path()] + list(styles or []):
+        if path and os.path.isfile(path):
+            parts.append(file_digest(path))
+        else:
+            parts.append(path)
+    parts.append(os.getenv("HIGHLIGHT_CSS_NAME", "autumn"))
+    parts.append(os.getenv("MATH_FORMAT", ""))
+    parts.append(highlight_css)
+    parts.append(ROOT)
+    return fingerprint(*parts)
+
+
+def convert_all(
+    src=join_path(LIB_ROOT, "temp"),
+    dst=None,
+    archive=None,
+    styles=None,
+    rebuild_css=False,
+    incremental=False,
+    workers=None,
+    toc=None,
+    sink=None,
+    threads=False,
+    overrides=None,
+):
     """
     转换 src 下的所有md文档
     通过styles参数传入css文件名列表时，默认样式将失效
+    incremental 为真时只重新生成新增或修改过的文档，并删除源文档已不存在的输出
+    toc 不为 None 时覆盖配置文件中的 toc
+    dst 以 .zip、.tar、.sqlite 等结尾或传入 sink 时，结果和存档都写入该输出目标，见 maxpress.sinks
+    各文档可以通过 front matter 或所在目录的 .maxpress-theme.json 使用不同主题，见 maxpress.themes
+    threads 为真时在当前进程的线程池中转换，不启动工作进程
+    overrides 覆盖配置文件和各主题中的同名项，例如监视时重新生成所用的 auto_rename=False
+    返回各项计数，其中 failed 为 [(文件路径, 错误信息)] 列表
     """
-    dst = dst or join_path(src, "../result/html")
+    from maxpress.batch import run_batch
+    from maxpress.sinks import SinkWriter, open_sink
+    from maxpress.themes import DIR_THEME_NAME, ThemeRegistry
 
-    config, styles = load_config_and_css(styles)
+    dst = dst or join_path(src, "../result/html")
+    sink = sink or open_sink(dst)
+    if sink is not None:
+        if incremental:
+            raise ValueError("incremental builds need a directory destination")
+        dst = sink.path
+
+    explicit_styles = styles
+    config, styles = load_config_and_css(styles, rebuild_css=rebuild_css)
+    if toc is not None:
+        config["toc"] = toc
+    config.update(overrides or {})
     if archive is None:
         archive = config["auto_archive"]
+    themes = ThemeRegistry(config, explicit_styles, rebuild_css=rebuild_css)
 
-    ps = []
-    for file, filepath in recursive_listdir(src):
+    # 存档会移走源文档，此时不维护清单；输出目标每次整批重写，也不需要清单
+    if archive or sink is not None:
+        manifest = None
+    else:
+        manifest = Manifest(dst, build_fingerprint(config, styles))
+    skipped = 0
+    seen = set()
+
+    # 每个目标目录只列出一次，在转换开始前为所有输出分配好不冲突的路径
+    namer = OutputNamer()
+    # 不自动重命名时，不同目录下的同名文档会写入同一个输出，按路径排序后只转换第一篇
+    claims = {} if not config["auto_rename"] and sink is None else None
+    tasks = []
+    keys = []
+    # 转换开始前就已失败的文档：主题无效或输出冲突
+    early_failed = []
+    for file, filepath in sorted(recursive_listdir(src), key=lambda item: item[1]):
         if file.endswith(".md"):
-            # convert_file(file, filepath, dst, config, styles, archive=archive)
+            if claims is not None:
+                htmlpath = output_path(file, filepath, dst)
+                owner = claims.setdefault(htmlpath, filepath)
+                if owner != filepath:
+                    error = "output {} is already written by {}".format(htmlpath, owner)
+                    log("转换失败[{}]: {}".format(filepath, error))
+                    early_failed.append((filepath, error))
+                    continue
+            # 每个主题在主进程中只编译一次
+            try:
+                theme = themes.resolve(filepath, src)
+            except (OSError, ValueError) as e:
+                log("转换失败[{}]: {!r}".format(filepath, e))
+                early_failed.append((filepath, "{!r}".format(e)))
+                if manifest is not None:
+                    # 保留旧的输出，下次运行时重新生成
+                    seen.add(os.path.relpath(filepath, src))
+                continue
+            if theme and overrides:
+                theme = (dict(theme[0], **overrides), theme[1])
+            key = digest = None
+            if manifest is not None:
+                key = os.path.relpath(filepath, src)
+                seen.add(key)
+                try:
+                    digest = file_digest(filepath)
+                except OSError:
+                    pass  # 交给转换过程报告错误
+                if digest and theme:
+                    # 主题的配置变化时同样需要重新生成
+                    digest = fingerprint(digest, json.dumps(theme[0], sort_keys=True), *theme[1])
+                if incremental and digest:
+                    if manifest.is_fresh(key, digest):
+                        manifest.keep(key)
+                        skipped += 1
+                        continue
+                    # 删除旧的输出，避免 auto_rename 时生成新的文件名
+                    old = manifest.previous_output(key)
+                    if old and os.path.isfile(old):
+                        os.remove(old)
             # renderer is not threadsafe
-            param = dict(
-                args=(file, filepath, dst, config, styles),
-                kwargs=dict(archive=archive, title=file[:-3]),
-            )
-            ps.append(param)
-        else:
+            kwargs = dict(archive=archive, title=file[:-3])
+            if theme:
+                kwargs["theme"] = theme
+            if sink is not None:
+                kwargs["key"] = os.path.relpath(filepath, src).replace(os.sep, "/")
+            tasks.append((file, filepath, dst, kwargs))
+            keys.append((key, digest))
+        elif file != DIR_THEME_NAME:
             if archive:
                 # 非.md文件统一移到src一级目录下等待手动删除，以防意外丢失
                 if re.split(r"[/\\]", filepath)[-2] != re.split(r"[/\\]", src)[-1]:
-                    shutil.move(filepath, autoname(join_path(src, file)))
+                    move_atomic(filepath, namer.assign(join_path(src, file)))
             else:
                 continue
 
-    map_do(_map_fn_wrapper, ps)
+    if config["auto_rename"] and sink is None:
+        # 按源文件路径排序分配，序号与遍历顺序和工作进程的完成顺序无关
+        for file, filepath, _, kwargs in sorted(tasks, key=lambda task: task[1]):
+            kwargs["htmlpath"] = namer.assign(output_path(file, filepath, dst))
+            if archive:
+                kwargs["archpath"] = namer.assign(archive_path(file))
+
+    if sink is None:
+        outputs, failed = run_batch(tasks, config, styles, workers=workers, threads=threads)
+    else:
+        writer = SinkWriter(sink)
+        try:
+            outputs, failed = run_batch(
+                tasks, config, styles, workers=workers, writer=writer, threads=threads
+            )
+        finally:
+            errors = writer.close()
+        failed += errors
+        # 写入失败的文档不计入
+        failed_paths = {filepath for filepath, _ in errors}
+        outputs = [None if task[1] in failed_paths else output
+                   for task, output in zip(tasks, outputs)]
+    failed = early_failed + failed
+    rebuilt = sum(1 for output in outputs if output)
+
+    removed = 0
+    if manifest is not None:
+        for (key, digest), output in zip(keys, outputs):
+            if output:
+                manifest.record(key, digest, output)
+        if incremental:
+            for key, output in manifest.removed(seen):
+                if os.path.isfile(output):
+                    os.remove(output)
+                    removed += 1
+        manifest.save()
 
     if archive:
         # 删除src中剩余的空目录
@@ -365,25 +624,124 @@ def convert_all(src=join_path(LIB_ROOT, "temp"), dst=None, archive=None, styles=
             except Exception:
                 pass
 
-    log(f"\n[+] 请进入{dst}查看所有生成的HTML文档")
+    log(f"\n[+] 重新生成{rebuilt}篇，跳过{skipped}篇，删除{removed}篇，失败{len(failed)}篇")
+    for filepath, error in failed:
+        log(f"[-] {filepath}\n{error}")
+    log(f"[+] 请进入{dst}查看所有生成的HTML文档")
     log(f"[+] 请进入{dst}查看所有存档的MarkDown文档")
+    return dict(rebuilt=rebuilt, skipped=skipped, removed=removed, failed=failed)
 
 
-def load_config_and_css(styles):
+def style_inputs(styles=None):
+    """
+    变化后需要全部重新生成的文件
+    """
+    paths = [
+        config_path,
+        get_styles_less(),
+        os.path.expandvars("$HOME/.config/maxpress/custom.css"),
+    ] + list(styles or [])
+    return {os.path.abspath(p) for p in paths}
+
+
+def watch_all(src, dst, styles=None, rebuild_css=False):
+    """
+    转换 src 下的所有md文档，之后只重新转换发生变化的文档；
+    配置、样式表或主题变化时全部重新生成；监视期间总是覆盖先前的输出文件
+    """
+    from maxpress.watch import watch
+    from maxpress.themes import THEMES_DIR, ThemeRegistry, is_theme_file
+
+    def rebuild():
+        convert_all(src, dst, archive=False, styles=styles, overrides=dict(auto_rename=False))
+        return load_config_and_css(styles)
+
+    convert_all(src, dst, archive=False, styles=styles, rebuild_css=rebuild_css,
+                overrides=dict(auto_rename=False))
+    config, css = load_config_and_css(styles)
+    themes = ThemeRegistry(config, styles)
+    inputs = style_inputs(styles)
+
+    def on_change(changed):
+        nonlocal config, css, themes
+        if changed & inputs or any(is_theme_file(path) for path in changed):
+            log("[+] 配置、样式表或主题发生变化，全部重新生成")
+            config, css = rebuild()
+            themes = ThemeRegistry(config, styles)
+            return
+        for filepath in sorted(changed):
+            file = os.path.basename(filepath)
+            if not file.endswith(".md") or not os.path.isfile(filepath):
+                continue
+            try:
+                cfg, sheets = themes.resolve(filepath, src) or (config, css)
+                # 反复保存时覆盖同一个输出文件
+                convert_file(file, filepath, dst, dict(cfg, auto_rename=False), sheets,
+                             title=file[:-3])
+            except Exception as e:
+                log("转换失败[{}]: {!r}".format(filepath, e))
+
+    log("[+] 正在监视{}，按Ctrl-C退出".format(src))
+    watch([src, THEMES_DIR] + sorted(inputs), on_change)
+
+
+def watch_file(filepath, dst, styles=None, rebuild_css=False):
+    """
+    转换单个md文档，之后在它或配置、样式表、主题变化时重新转换；
+    与不监视时一样按 front matter 或同一目录下的 .maxpress-theme.json 使用主题
+    """
+    from maxpress.watch import watch
+    from maxpress.themes import DIR_THEME_NAME, THEMES_DIR, ThemeRegistry, is_theme_file
+
+    file = os.path.basename(filepath)
+    config, css = load_config_and_css(styles, rebuild_css=rebuild_css)
+    themes = ThemeRegistry(config, styles, rebuild_css=rebuild_css)
+    inputs = style_inputs(styles)
+
+    def render():
+        try:
+            # 每次都重新读取 front matter，文档可以改用其他主题
+            cfg, sheets = themes.resolve(filepath) or (config, css)
+            # 反复保存时覆盖同一个输出文件
+            convert_file(file, filepath, dst, dict(cfg, auto_rename=False), sheets,
+                         title=file[:-3])
+        except Exception as e:
+            log("转换失败[{}]: {!r}".format(filepath, e))
+
+    def on_change(changed):
+        nonlocal config, css, themes
+        if changed & inputs or any(is_theme_file(path) for path in changed):
+            config, css = load_config_and_css(styles)
+            themes = ThemeRegistry(config, styles)
+        if os.path.isfile(filepath):
+            render()
+
+    render()
+    log("[+] 正在监视{}，按Ctrl-C退出".format(filepath))
+    dir_theme = join_path(os.path.dirname(os.path.abspath(filepath)), DIR_THEME_NAME)
+    watch([filepath, dir_theme, THEMES_DIR] + sorted(inputs), on_change)
+
+
+def load_config_and_css(styles, rebuild_css=False):
+    # 内联器尚未加载时无需重置，也不必为此导入 premailer
+    inliner = sys.modules.get("maxpress.inliner")
+    if inliner:
+        inliner.reset_inliner()
+    stylesheets = sys.modules.get("maxpress.stylesheets")
+    if stylesheets:
+        stylesheets.reset_loader()
     log("[+] 正在导入配置文件...", end=" ")
-    config = import_config()
+    config = read_config()
     log("导入成功")
 
     if not styles:
-        log("[+] 正在编译CSS样式表...", end=" ")
-        compile_styles()
-        log("编译成功")
+        styles = [cached_css(config, rebuild_css)]
     elif isinstance(styles, str):
         styles = [styles]
     return config, styles
 
 
-def convert_markdown(text, title, config, styles):
+def convert_markdown(text, title, config, styles, workers=None):
     return md2html(
         text,
         title=title,
@@ -391,44 +749,71 @@ def convert_markdown(text, title, config, styles):
         poster=config["poster_url"],
         banner=config["banner_url"],
         convert_list=config["convert_list"],
+        toc=config.get("toc", False),
+        workers=workers,
     )
 
 
-def convert_file(file, filepath, dst, config, styles, archive=False, title=""):
+def render_file(file, filepath, config, styles, title="", workers=None):
+    """
+    读取并转换一篇文档，返回 HTML 而不写入文件
+    """
     log("[+] 正在转换{}...".format(file), end=" ")
-    middle_path = os.path.dirname(os.path.relpath(filepath, ROOT)) if ROOT else None
 
-    with open(filepath, encoding="utf-8") as md_file:
-        text = md_file.read()
-    result = convert_markdown(text, title or file[-3], config, styles)
+    with profiling.stage("read"):
+        with open(filepath, encoding="utf-8") as md_file:
+            text = md_file.read()
+    return convert_markdown(text, title or file[:-3], config, styles, workers=workers)
+
+
+def convert_file(
+    file,
+    filepath,
+    dst,
+    config,
+    styles,
+    archive=False,
+    title="",
+    workers=None,
+    htmlpath=None,
+    archpath=None,
+):
+    """
+    htmlpath、archpath 为批量转换时预先分配好的输出、存档路径
+    """
+    result = render_file(file, filepath, config, styles, title=title, workers=workers)
 
-    if middle_path:
-        htmlpath = join_path(dst, middle_path, file[:-3] + ".html")
-    else:
-        htmlpath = join_path(dst, file[:-3] + ".html")
-    if config["auto_rename"]:
-        htmlpath = autoname(htmlpath)
-    prepare_dir(htmlpath)
-    with open(htmlpath, "w", encoding="utf-8") as html_file:
-        html_file.write(result)
+    if not htmlpath:
+        htmlpath = output_path(file, filepath, dst)
+        if config["auto_rename"]:
+            htmlpath = autoname(htmlpath)
+    with profiling.stage("write"):
+        write_atomic(htmlpath, result)
     log("转换成功[{}]".format(htmlpath.split("/")[-1]))
 
     if archive:
         log("[+] 正在存档{}...".format(file), end=" ")
-        arch_dir = join_path(LIB_ROOT, "result", "archive")
-        if not os.path.exists(arch_dir):
-            os.mkdir(arch_dir)
-        archpath = join_path(arch_dir, file)
-        if config["auto_rename"]:
-            archpath = autoname(archpath)
-        prepare_dir(archpath)
-        shutil.move(filepath, archpath)
+        if not archpath:
+            archpath = archive_path(file)
+            if config["auto_rename"]:
+                archpath = autoname(archpath)
+        with profiling.stage("archive"):
+            move_atomic(filepath, archpath)
         log("存档成功[{}]".format(archpath.split("/")[-1]))
         return archpath
     return htmlpath
 
 
 def main():
+    if sys.argv[1:2] == ["serve"]:
+        from maxpress.server import main as serve_main
+
+        return serve_main(sys.argv[2:])
+    if sys.argv[1:2] == ["stream"]:
+        from maxpress.stream import main as stream_main
+
+        return stream_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-a",
@@ -446,23 +831,123 @@ def main():
     parser.add_argument(
         "--dst",
         default=join_path(LIB_ROOT, "result", "html"),
-        help="destination directory",
+        help="destination directory; with --all, a .zip/.tar/.sqlite file bundles the batch",
     )
     parser.add_argument("--styles", nargs="*", help="css file path")
+    parser.add_argument(
+        "--rebuild-css",
+        action="store_true",
+        help="ignore cached stylesheet and recompile less",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="with --all, only convert new or changed *.md",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of worker processes; for a single large file, render it in sections",
+    )
+    parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="with --all, convert in a thread pool instead of worker processes",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running and re-convert files when they change",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="load remote stylesheets only from the local cache",
+    )
+    parser.add_argument(
+        "--toc", action="store_true", help="prepend a table of contents"
+    )
+    parser.add_argument(
+        "--math",
+        choices=["mathml", "svg"],
+        help="pre-render formulas to MathML or SVG instead of loading the MathJax script",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="write per-file stage timings and a summary.json into DIR",
+    )
     args = parser.parse_args()
+    if args.offline:
+        # 通过环境变量传递，批量转换的工作进程也会沿用
+        os.environ["MAXPRESS_OFFLINE"] = "1"
+    if args.math:
+        os.environ["MATH_FORMAT"] = args.math
+    profile = None
+    if args.profile:
+        profile = profiling.Profile(args.profile)
+        profiling.add_hook(profile)
+
+    if args.watch:
+        try:
+            if args.all:
+                watch_all(args.src, args.dst, args.styles, args.rebuild_css)
+            else:
+                watch_file(args.src, args.dst, args.styles, args.rebuild_css)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    try:
+        convert_from_args(args)
+    finally:
+        if profile:
+            report_profile(profile)
 
+
+def convert_from_args(args):
     if args.all:
-        convert_all(src=args.src, dst=args.dst, archive=args.archive)
+        summary = convert_all(
+            src=args.src,
+            dst=args.dst,
+            archive=args.archive,
+            styles=args.styles,
+            rebuild_css=args.rebuild_css,
+            incremental=args.incremental,
+            workers=args.workers,
+            toc=args.toc or None,
+            threads=args.threads,
+        )
+        if summary["failed"]:
+            sys.exit(1)
     else:
-        config, styles = load_config_and_css(args.styles)
+        from maxpress.themes import ThemeRegistry
+
+        config, styles = load_config_and_css(args.styles, rebuild_css=args.rebuild_css)
         archive = config["auto_archive"]
 
         filepath = args.src
         file = os.path.basename(filepath)
         if os.path.isfile(filepath) and file.endswith(".md"):
-            htmlpath = convert_file(
-                file, filepath, args.dst, config, styles, archive=archive
-            )
+            registry = ThemeRegistry(config, args.styles, rebuild_css=args.rebuild_css)
+            config, styles = registry.resolve(filepath) or (config, styles)
+            if args.toc:
+                config["toc"] = True
+            baseline = profiling.cache_counters() if profiling.active() else None
+            with profiling.trace(filepath):
+                htmlpath = convert_file(
+                    file,
+                    filepath,
+                    args.dst,
+                    config,
+                    styles,
+                    archive=archive,
+                    workers=args.workers,
+                )
+            if baseline is not None:
+                profiling.add_cache_counters(
+                    profiling.since(profiling.cache_counters(), baseline)
+                )
             if not args.stdout:
                 print(htmlpath)
                 os.system("open {}".format(htmlpath))
@@ -473,6 +958,19 @@ def main():
         log("--src should be a *.md file")
 
 
+def report_profile(profile, top=5):
+    summary = profile.save()
+    log("[+] 共{files}篇，总耗时{total:.1f}ms，p50 {p50:.1f}ms，p90 {p90:.1f}ms".format(**summary))
+    for name, stat in sorted(summary["stages"].items(), key=lambda x: -x[1]["total"]):
+        log("    {:<10} 合计{total:>10.1f}ms  p50 {p50:.2f}ms  p99 {p99:.2f}ms".format(name, **stat))
+    for name, counters in sorted(summary["caches"].items()):
+        log("    {:<16} 命中{}次，未命中{}次".format(
+            name, counters.get("hits", 0) + counters.get("disk_hits", 0), counters.get("misses", 0)))
+    for item in summary["slowest"][:top]:
+        log("    最慢: {name} {total:.1f}ms".format(**item))
+    log("[+] 详细结果已写入{}".format(profile.directory))
+
+
 if __name__ == "__main__":
     # ./maxpress.py --src temp/example.md 2>/dev/null | xargs open
     # then copy & paste
@@ -0,0 +1,167 @@
+"""
+asyncio 接口
+
+    from maxpress import aio
+
+    html = await aio.render(text, "标题")
+
+    async with aio.AsyncConverter(workers=4) as converter:
+        html = await converter.render(text, "标题")
+        async for key, html in converter.render_as_completed(documents):
+            ...
+
+渲染在 AsyncConverter 管理的进程池（默认）或线程池中进行，同时提交的文档数不超过 max_pending；
+取消等待中的协程时，尚未开始的转换不再执行（已经开始的在工作进程中完成后丢弃）。
+配置、LESS 编译和样式表（包括 HIGHLIGHT_CSS_URL 等远程样式表）在启动时于线程中加载，不阻塞事件循环。
+"""
+import os
+import asyncio
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from maxpress.converter import Converter
+
+_converter = None
+
+
+def _init_worker(styles, config):
+    global _converter
+    _converter = Converter(styles, config)
+
+
+def _render(text, title):
+    return _converter.render(text, title)
+
+
+class AsyncConverter:
+    """
+    executor 为 "process" 或 "thread"；线程池中各线程共用一个 Converter，
+    markdown 的解析和渲染在线程之间串行
+    """
+
+    def __init__(self, styles=None, config=None, workers=None, max_pending=None,
+                 executor="process"):
+        if executor not in ("process", "thread"):
+            raise ValueError("executor must be 'process' or 'thread'")
+        self.styles = styles
+        self.config = config
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_pending = max(1, max_pending or self.workers * 2)
+        self.kind = executor
+        self.converter = None
+        self._executor = None
+        self._slots = None
+        self._starting = None
+
+    async def start(self):
+        """
+        加载配置和样式表并启动线程池或进程池；render 在第一次调用时也会自动启动
+        """
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._starting)
+        return self
+
+    async def _start(self):
+        loop = asyncio.get_running_loop()
+        # 读取文件、编译 LESS、下载远程样式表都在线程中进行
+        converter = await loop.run_in_executor(None, Converter, self.styles, self.config)
+        if self.kind == "thread":
+            executor = ThreadPoolExecutor(self.workers)
+        else:
+            # 工作进程使用已编译、已缓存的样式表，不再重复编译和下载
+            executor = ProcessPoolExecutor(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(converter.styles, converter.config),
+            )
+        self.converter = converter
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._executor = executor
+
+    async def render(self, text, title=""):
+        await self.start()
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            if self.kind == "thread":
+                call = loop.run_in_executor(self._executor, self.converter.render, text, title)
+            else:
+                call = loop.run_in_executor(self._executor, _render, text, title)
+            # 协程被取消时，run_in_executor 返回的 future 会一并取消尚未开始的任务
+            return await call
+
+    async def render_as_completed(self, documents, return_exceptions=False):
+        """
+        documents 为 [(key, text, title)]，按完成顺序逐个产出 (key, html)；
+        return_exceptions 为真时失败的文档产出 (key, 异常)，否则抛出异常。
+        只从 documents 中预读 max_pending 篇；停止迭代或被取消时，未完成的转换全部取消
+        """
+        await self.start()
+
+        async def keyed(key, text, title):
+            return key, await self.render(text, title)
+
+        documents = iter(documents)
+        pending = {}
+        try:
+            while True:
+                while len(pending) < self.max_pending:
+                    try:
+                        key, text, title = next(documents)
+                    except StopIteration:
+                        break
+                    pending[asyncio.ensure_future(keyed(key, text, title))] = key
+                if not pending:
+                    return
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = pending.pop(task)
+                    if task.exception() is None:
+                        yield task.result()
+                    elif return_exceptions:
+                        yield key, task.exception()
+                    else:
+                        raise task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def close(self):
+        if self._starting is not None:
+            await asyncio.gather(self._starting, return_exceptions=True)
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            # 丢弃排队中的任务，等待正在进行的转换结束，不阻塞事件循环
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, lambda: executor.shutdown(cancel_futures=True))
+        self._starting = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+# 每个事件循环一个，asyncio 的同步原语不能跨事件循环使用
+_defaults = weakref.WeakKeyDictionary()
+
+
+def get_converter():
+    """
+    模块级函数在当前事件循环中共用的 AsyncConverter，使用 config.json 和默认样式表
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _defaults:
+        _defaults[loop] = AsyncConverter()
+    return _defaults[loop]
+
+
+async def render(text, title=""):
+    return await get_converter().render(text, title)
+
+
+def render_as_completed(documents, return_exceptions=False):
+    return get_converter().render_as_completed(documents, return_exceptions)
@@ -0,0 +1,161 @@
+"""
+convert_all 使用的批量转换引擎
+
+- 进程数取 CPU 数与任务块数中较小者，只有一个任务块时直接在当前进程中转换
+- 小文件按大小合并成任务块提交，减少进程间通信
+- 每个工作进程在初始化时只接收并加载一次配置、样式表和渲染器；
+  远程样式表由主进程下载一次，文本随初始化参数传给工作进程
+- 单个文件的异常被收集起来返回，不会中断整个批次，也不会被静默丢弃
+- 输出到 zip/tar/SQLite 时，工作进程只渲染，结果由主进程的写入线程交给输出目标
+- threads 为真时任务块在当前进程的线程池中转换，各线程共用配置、样式表和内联器
+- 记录性能数据时，每个任务块连同所在进程的缓存计数一起返回，由主进程合并
+"""
+import os
+import traceback
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import maxpress
+from maxpress import profiling
+
+# 每个任务块的大致字节数和最多文件数
+CHUNK_BYTES = 256 * 1024
+CHUNK_FILES = 64
+
+_config = None
+_styles = None
+_profile = False
+_render_only = False
+_baseline = None
+
+
+def _init_worker(config, styles, profile=False, render_only=False, stylesheets=None):
+    global _config, _styles, _profile, _render_only, _baseline
+    _config, _styles, _profile, _render_only = config, styles, profile, render_only
+    if stylesheets:
+        # spawn 创建的进程不继承主进程的加载器
+        from maxpress.stylesheets import get_loader
+
+        get_loader().seed(stylesheets)
+    # 预热渲染器和内联器，之后的每个文件都不再承担这部分开销
+    maxpress.md2html("", styles=styles)
+    # fork 出的工作进程沿用主进程的缓存计数，只统计此后的部分
+    _baseline = profiling.cache_counters() if profile else None
+
+
+def _convert_chunk(chunk):
+    results = []
+    for index, file, filepath, dst, kwargs in chunk:
+        # 使用主题的文档带有自己的配置和样式表
+        kwargs = dict(kwargs)
+        config, styles = kwargs.pop("theme", (_config, _styles))
+        # 计时结果随转换结果一起传回主进程，由主进程交给钩子
+        tracer = profiling.trace(filepath, emit=False) if _profile else nullcontext()
+        output = error = None
+        try:
+            with tracer:
+                if _render_only:
+                    output = maxpress.render_file(
+                        file, filepath, config, styles, title=kwargs.get("title", "")
+                    )
+                    maxpress.log("渲染成功")
+                else:
+                    output = maxpress.convert_file(
+                        file, filepath, dst, config, styles, **kwargs
+                    )
+        except Exception as e:
+            maxpress.log("转换失败[{}]: {!r}".format(filepath, e))
+            error = traceback.format_exc()
+        trace = tracer.trace.as_dict() if _profile else None
+        results.append((index, output, error, trace))
+    # 缓存计数是进程内的累计值，同一进程的多个任务块由主进程取最新的一份
+    counters = profiling.since(profiling.cache_counters(), _baseline) if _profile else None
+    return results, os.getpid(), counters
+
+
+def _latest(previous, counters):
+    return {
+        name: {k: max(n, previous.get(name, {}).get(k, 0)) for k, n in values.items()}
+        for name, values in counters.items()
+    }
+
+
+def make_chunks(tasks, chunk_bytes=CHUNK_BYTES, chunk_files=CHUNK_FILES):
+    chunks = []
+    current, size = [], 0
+    for index, (file, filepath, dst, kwargs) in enumerate(tasks):
+        try:
+            file_size = os.path.getsize(filepath)
+        except OSError:
+            file_size = 0
+        if current and (size + file_size > chunk_bytes or len(current) >= chunk_files):
+            chunks.append(current)
+            current, size = [], 0
+        current.append((index, file, filepath, dst, kwargs))
+        size += file_size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def pool_size(n_chunks, workers=None):
+    return max(1, min(workers or os.cpu_count() or 1, n_chunks))
+
+
+def run_batch(tasks, config, styles, workers=None, writer=None, threads=False):
+    """
+    tasks 为 (file, filepath, dst, kwargs) 列表；
+    返回与 tasks 一一对应的输出路径列表（失败的为 None），以及 [(filepath, traceback)] 形式的错误列表
+    writer 为 sinks.SinkWriter 时由它写入结果和存档，输出路径为结果在输出目标中的位置
+    """
+    outputs = [None] * len(tasks)
+    errors = []
+    chunks = make_chunks(tasks)
+    n = pool_size(len(chunks), workers)
+
+    profile = profiling.active()
+    render_only = writer is not None
+    cache_counters = {}
+
+    def collect(chunk_result):
+        results, pid, counters = chunk_result
+        if counters is not None:
+            cache_counters[pid] = _latest(cache_counters.get(pid, {}), counters)
+        for index, output, error, trace in results:
+            if writer is not None and output is not None:
+                file, filepath, _, kwargs = tasks[index]
+                output = writer.put(
+                    kwargs["key"], output, filepath, archive=kwargs.get("archive", False)
+                )
+            outputs[index] = output
+            if error:
+                errors.append((tasks[index][1], error))
+            if trace:
+                profiling.emit(trace)
+
+    if n == 1:
+        _init_worker(config, styles, profile, render_only)
+        for chunk in chunks:
+            collect(_convert_chunk(chunk))
+    elif threads:
+        _init_worker(config, styles, profile, render_only)
+        with ThreadPoolExecutor(n) as executor:
+            futures = [executor.submit(_convert_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                collect(future.result())
+    else:
+        # 远程样式表在父进程中加载一次，工作进程不再各自请求
+        from maxpress.stylesheets import prefetch
+
+        texts = prefetch(list(styles or []) + [maxpress.highlight_css])
+        with ProcessPoolExecutor(
+            n,
+            initializer=_init_worker,
+            initargs=(config, styles, profile, render_only, texts),
+        ) as executor:
+            futures = [executor.submit(_convert_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                collect(future.result())
+    for counters in cache_counters.values():
+        profiling.add_cache_counters(counters)
+    return outputs, errors
@@ -0,0 +1,55 @@
+"""
+进程内复用的转换器
+
+    from maxpress import Converter
+
+    converter = Converter()
+    html = converter.render(text, "标题")
+    pages = converter.render_many([(text, "标题"), ...], workers=8)
+
+配置、样式表和内联器在创建时只加载一次，之后不再读取 config.json 或样式表文件。
+环境变量与 md2html 一样在渲染时生效：HIGHLIGHT_CSS_NAME、TEXT_PER_PARAGRAPH 在导入时确定，
+MATH_FORMAT 每次渲染时读取（块级渲染缓存的键也包含这三项），修改后不需要重新创建转换器。
+render 可以在多个线程中同时调用：markdown 的解析和渲染受 mistletoe 模块级状态的限制，
+在线程之间串行（见 maxpress.renderer.parse_lock），打包和内联样式并行进行。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import maxpress
+
+
+class Converter:
+    def __init__(self, styles=None, config=None, rebuild_css=False):
+        """
+        config 为 None 时读取 config.json；styles 为 css 文件路径或列表，为空时按配置编译默认样式表
+        """
+        from maxpress.inliner import Inliner
+
+        self.config = dict(maxpress.read_config() if config is None else config)
+        if isinstance(styles, str):
+            styles = [styles]
+        self.styles = list(styles) if styles else [maxpress.cached_css(self.config, rebuild_css)]
+        self.inliner = Inliner()
+        # 预热：加载、解析样式表和渲染器
+        self.render("")
+
+    def render(self, text, title=""):
+        config = self.config
+        return maxpress.md2html(
+            text,
+            title=title,
+            styles=self.styles,
+            poster=config["poster_url"],
+            banner=config["banner_url"],
+            convert_list=config["convert_list"],
+            toc=config.get("toc", False),
+            inliner=self.inliner,
+        )
+
+    def render_many(self, items, workers=None):
+        """
+        在线程池中转换 [(text, title)]，按输入顺序返回结果
+        """
+        with ThreadPoolExecutor(workers or os.cpu_count() or 1) as executor:
+            return list(executor.map(lambda item: self.render(*item), items))
@@ -0,0 +1,241 @@
+"""
+顶层块渲染结果缓存
+
+mistletoe_parse 把文档在顶层块边界处切开，以每块的原文和渲染设置为键缓存渲染结果；
+修改长文档中的一段后重新转换，只有变化的块需要重新解析和渲染，结果与整篇渲染相同。
+
+依赖全文的状态：
+- 链接引用定义：块中含有 "[" 时，全文定义的哈希也是键的一部分，定义变化时这些块重新渲染；
+- 未标注语言的代码块按全文用到的语言判断：含有这种代码块的块按语言集合分别缓存；
+- 标题 id 在全文范围内去重，目录也取自全文：缓存中的 id 为占位符，拼接时按顺序分配；
+- 列表是否松散取决于其后隔着空行的一行：每块与下一块的第一行一起解析，这一行也是键的一部分；
+- 列表中的链接引用定义只对其后的块可见，含有这种定义的文档整篇渲染，不使用缓存。
+
+进程内缓存的块数由 MAXPRESS_FRAGMENT_CACHE_SIZE 设置（默认 32768，0 为关闭）；
+设置 MAXPRESS_FRAGMENT_CACHE_DIR 时同时保存到该目录，多次运行、多个进程之间共享。
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import mistletoe
+import pygments
+
+from mistletoe_contrib.static_math import converter_version, current_format
+from mistletoe_contrib.toc_renderer import slugify
+
+from maxpress import profiling
+from maxpress.renderer import HOSTNAME, MixRender, escape_ordered_lists
+from maxpress.sections import _lines, _parse, _unlabeled_code, scan_blocks
+
+# 渲染器的实现变化时修改，使磁盘上的旧缓存失效
+CACHE_VERSION = 5
+# 小于该字节数的文档直接整篇渲染
+MIN_BYTES = int(os.getenv("MAXPRESS_FRAGMENT_MIN_BYTES", 16 * 1024))
+
+
+class FragmentCache:
+    """
+    键为字符串、值为可以 JSON 序列化的对象的 LRU 缓存，可选地保存到 directory
+    """
+
+    def __init__(self, maxsize=8192, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = None
+        if self.directory:
+            try:
+                with open(self._disk_path(key), encoding="utf-8") as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                pass
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        if self.directory:
+            from maxpress.naming import write_atomic
+
+            write_atomic(self._disk_path(key), json.dumps(value, ensure_ascii=False))
+        self._remember(key, value)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self._entries),
+                        maxsize=self.maxsize)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+fragment_cache = FragmentCache(
+    maxsize=int(os.getenv("MAXPRESS_FRAGMENT_CACHE_SIZE", 32768)),
+    directory=os.getenv("MAXPRESS_FRAGMENT_CACHE_DIR"),
+)
+
+
+def enabled(text):
+    return (fragment_cache.maxsize > 0 or fragment_cache.directory) and len(text) >= MIN_BYTES
+
+
+def _digest(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _settings(convert_list):
+    math_format = current_format()
+    return (CACHE_VERSION, mistletoe.__version__, pygments.__version__, convert_list,
+            os.getenv("HIGHLIGHT_CSS_NAME", "autumn"), bool(os.getenv("TEXT_PER_PARAGRAPH")),
+            HOSTNAME, math_format, converter_version(math_format))
+
+
+def _split(lines, starts):
+    bounds = [0] + [start for start in starts if start > 0] + [len(lines)]
+    return [lines[begin:end] for begin, end in zip(bounds, bounds[1:]) if end > begin]
+
+
+class _Block:
+    def __init__(self, lines, lookahead, key):
+        self.lines = lines
+        self.lookahead = lookahead
+        self.key = key
+        self.doc = None
+        self.entry = None
+
+
+class FragmentRender(MixRender):
+    """
+    标题 id 输出为占位符；占位符取决于块的键，缓存的结果可以在其他文档、其他进程中复用
+    """
+
+    def start_block(self, key):
+        self.nonce = "mxp" + key[:24]
+        self.slugs = []
+        self._headings = []
+
+    def heading_id(self, text):
+        self.slugs.append(slugify(text))
+        return "{}-{}-".format(self.nonce, len(self.slugs) - 1)
+
+
+def _parse_block(block, footnotes, convert_list):
+    if block.doc is None:
+        block.doc = _parse(block.lines, footnotes, block.lookahead)
+        if convert_list:
+            escape_ordered_lists(block.doc)
+    return block.doc
+
+
+def render(text, toc=False, convert_list=False, cache=None):
+    """
+    渲染 text，结果与整篇交给 MixRender 相同；列表中含有链接引用定义时返回 None
+    """
+    cache = cache or fragment_cache
+    lines = _lines(text)
+    with profiling.stage("scan"):
+        starts, footnotes, _ = scan_blocks(lines)
+    settings = _digest(*_settings(convert_list))
+    footnotes_key = _digest(json.dumps(sorted(footnotes.items())))
+    blocks = []
+    chunks = _split(lines, starts)
+    for i, block_lines in enumerate(chunks):
+        source = "".join(block_lines)
+        # 列表是否松散取决于下一块的第一行，见 sections._parse
+        lookahead = chunks[i + 1][0] if i + 1 < len(chunks) else None
+        key = _digest(settings, source, lookahead, footnotes_key if "[" in source else "")
+        blocks.append(_Block(block_lines, lookahead, key))
+
+    # 第一步：各块用到的语言、是否含有未标注语言的代码块
+    for block in blocks:
+        block.entry = cache.get(block.key)
+        if block.entry is None:
+            doc = _parse_block(block, footnotes, convert_list)
+            if set(doc.footnotes) != set(footnotes):
+                return None
+            block.entry = dict(
+                languages=sorted(set(MixRender._collect_languages(doc))),
+                unlabeled=_unlabeled_code(doc),
+                html={},
+            )
+    languages = sorted(set().union(*(b.entry["languages"] for b in blocks)))
+
+    # 第二步：渲染缓存中没有的块，未标注语言的代码块按全文的语言集合分别缓存
+    variant = json.dumps(languages)
+    for block in blocks:
+        if (variant if block.entry["unlabeled"] else "") not in block.entry["html"]:
+            # 在创建渲染器之前解析：渲染器会注册 Math 等额外的词法单元，整篇渲染时解析不受它们影响
+            _parse_block(block, footnotes, convert_list)
+    results = []
+    with FragmentRender() as renderer:
+        renderer._languages = tuple(languages)
+        renderer.footnotes.update(footnotes)
+        for block in blocks:
+            entry = block.entry
+            key = variant if entry["unlabeled"] else ""
+            if key not in entry["html"]:
+                doc = block.doc
+                renderer.start_block(block.key)
+                entry["html"][key] = dict(
+                    children=[renderer.render(child) for child in doc.children],
+                    slugs=renderer.slugs,
+                    headings=renderer._headings,
+                )
+                cache.put(block.key, entry)
+            results.append((block, entry["html"][key]))
+
+    # 按全文顺序给标题分配 id，替换占位符
+    parts = []
+    headings = []
+    with MixRender() as renderer:
+        for block, result in results:
+            children = result["children"]
+            if result["slugs"]:
+                nonce = "mxp" + block.key[:24]
+                ids = {"{}-{}-".format(nonce, k): renderer.heading_id(slug)
+                       for k, slug in enumerate(result["slugs"])}
+                placeholder = re.compile(re.escape(nonce) + r"-\d+-")
+                children = [placeholder.sub(lambda m: ids[m.group()], child)
+                            for child in children]
+                headings.extend((level, title, ids[anchor])
+                                for level, title, anchor in result["headings"])
+            parts.extend(children)
+        inner = "\n".join(parts)
+        rendered = ("{}\n".format(inner) if inner else "") + renderer.mathjax_src
+        if toc:
+            return '<div id="toc">{}</div>'.format(renderer.render_toc(headings)) + rendered
+        return rendered
@@ -0,0 +1,118 @@
+"""
+可复用的 CSS 内联器
+
+premailer.transform 每次调用都会重新读取、解析 pack_html 注入的样式表，
+批量转换时大部分时间都耗在这里。Inliner 在一个批次内只加载、解析一次样式表，
+并在每篇文档中跳过主体标签不存在的选择器，输出与 premailer.transform 一致。
+"""
+import re
+import threading
+
+import premailer
+
+# 解析器总会补全这几个标签
+_IMPLIED_TAGS = frozenset(["html", "head", "body"])
+_tag_regex = re.compile(r"<([a-zA-Z][\w-]*)")
+_bracket_regex = re.compile(r"\[[^\]]*\]|\([^)]*\)")
+_combinator_regex = re.compile(r"\s*[\s>+~]\s*")
+_subject_tag_regex = re.compile(r"^([a-zA-Z][\w-]*)")
+
+
+def subject_tag(selector):
+    """
+    返回选择器最右侧复合选择器要求的标签名，没有标签限制时返回 None
+    """
+    selector = _bracket_regex.sub("", selector).strip()
+    compound = _combinator_regex.split(selector)[-1]
+    m = _subject_tag_regex.match(compound)
+    return m.group(1).lower() if m else None
+
+
+def document_tags(html):
+    return _IMPLIED_TAGS | {tag.lower() for tag in _tag_regex.findall(html)}
+
+
+class Inliner(premailer.Premailer):
+    """
+    批次内复用的 Premailer：外部样式表按 url 只加载一次（远程样式表经由 maxpress.stylesheets），
+    每个样式表的规则只解析一次，之后仅按文档中出现的标签过滤。
+    可以在多个线程中同时调用 transform：每次调用的状态保存在线程局部变量中，
+    加载、解析样式表（cssutils 不是线程安全的）加锁进行
+    """
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self._externals = {}
+        self._parsed = {}
+        self._leftover_text = {}
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+    @property
+    def _tags(self):
+        return getattr(self._local, "tags", None)
+
+    @_tags.setter
+    def _tags(self, tags):
+        self._local.tags = tags
+
+    def _load_external(self, url):
+        with self._lock:
+            if url not in self._externals:
+                self._externals[url] = super()._load_external(url)
+            return self._externals[url]
+
+    def _load_external_url(self, url):
+        # 经由共用的样式表加载器下载：复用连接、带缓存，并支持离线模式
+        from maxpress.stylesheets import get_loader
+
+        return get_loader().load(url)
+
+    def _parse_style_rules(self, css_body, ruleset_index):
+        key = (css_body, ruleset_index)
+        with self._lock:
+            if key not in self._parsed:
+                rules, leftover = super()._parse_style_rules(css_body, ruleset_index)
+                tagged = [(subject_tag(rule[1]), rule) for rule in rules]
+                self._parsed[key] = (tagged, leftover)
+            tagged, leftover = self._parsed[key]
+        tags = self._tags
+        rules = [
+            rule for tag, rule in tagged if tags is None or tag is None or tag in tags
+        ]
+        return rules, leftover
+
+    def _css_rules_to_string(self, rules):
+        # leftover 列表来自 _parsed 缓存，按对象复用其文本
+        key = id(rules)
+        with self._lock:
+            if key not in self._leftover_text:
+                self._leftover_text[key] = (rules, super()._css_rules_to_string(rules))
+            return self._leftover_text[key][1]
+
+    def transform(self, html=None, pretty_print=False, **kwargs):
+        self._tags = document_tags(html) if isinstance(html, str) else None
+        try:
+            return super().transform(html, pretty_print=pretty_print, **kwargs)
+        finally:
+            self._tags = None
+
+
+_inliner = None
+_inliner_lock = threading.Lock()
+
+
+def get_inliner():
+    global _inliner
+    with _inliner_lock:
+        if _inliner is None:
+            _inliner = Inliner()
+        return _inliner
+
+
+def reset_inliner():
+    """
+    开始新的批次时调用，丢弃已缓存的样式表
+    """
+    global _inliner
+    _inliner = None
@@ -0,0 +1,86 @@
+"""
+增量构建清单
+
+保存在输出目录中，记录每篇源文档的内容哈希和生成的HTML路径，
+以及配置、样式表等全局输入的指纹；指纹变化时所有文档都需要重新生成。
+"""
+import os
+import json
+import hashlib
+
+MANIFEST_NAME = ".maxpress-manifest.json"
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class Manifest:
+    def __init__(self, dst, fingerprint):
+        self.path = os.path.join(dst, MANIFEST_NAME)
+        self.fingerprint = fingerprint
+        self.previous = {}
+        self.files = {}
+        self.stale = True
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.previous = data.get("files", {})
+        self.stale = data.get("fingerprint") != fingerprint
+
+    def is_fresh(self, key, digest):
+        entry = self.previous.get(key)
+        return (
+            not self.stale
+            and entry is not None
+            and entry["hash"] == digest
+            and os.path.isfile(entry["output"])
+        )
+
+    def keep(self, key):
+        self.files[key] = self.previous[key]
+
+    def previous_output(self, key):
+        entry = self.previous.get(key)
+        return entry and entry["output"]
+
+    def record(self, key, digest, output):
+        self.files[key] = {"hash": digest, "output": output}
+
+    def removed(self, seen):
+        """
+        返回源文档已被删除的条目；输出仍属于本次记录的其他文档时不包括在内
+        """
+        owned = {e["output"] for e in self.files.values()}
+        return [
+            (key, e["output"])
+            for key, e in self.previous.items()
+            if key not in seen and e["output"] not in owned
+        ]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"fingerprint": self.fingerprint, "files": self.files},
+                f,
+                ensure_ascii=False,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(tmp_path, self.path)
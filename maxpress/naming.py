@@ -0,0 +1,100 @@
+"""
+输出文件命名与原子写入
+
+auto_rename 时，OutputNamer 对每个目标目录只列出一次已有文件，
+在同一批次内依次为每个输出分配 name.html、name(1).html、name(2).html……
+并记住已分配的名字，因此并行的工作进程不会选中同一个路径。
+写入先写到同目录下的临时文件再改名，不会留下写了一半的文件。
+"""
+import os
+import re
+import shutil
+import threading
+
+_ext = re.compile(r"\.\w+?$")
+
+
+def split_ext(path):
+    m = _ext.search(path)
+    if not m:
+        return path, ""
+    return path[: m.start()], m.group()
+
+
+def numbered(path, n):
+    if n == 0:
+        return path
+    stem, ext = split_ext(path)
+    return "{}({}){}".format(stem, n, ext)
+
+
+class OutputNamer:
+    def __init__(self):
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def _listing(self, directory):
+        if directory not in self._names:
+            try:
+                self._names[directory] = set(os.listdir(directory))
+            except OSError:
+                self._names[directory] = set()
+        return self._names[directory]
+
+    def assign(self, path):
+        """
+        返回 path 或第一个既不存在、也未在本批次分配过的带序号路径
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        with self._lock:
+            taken = self._listing(directory)
+            n = 0
+            while os.path.basename(numbered(path, n)) in taken:
+                n += 1
+            result = numbered(path, n)
+            taken.add(os.path.basename(result))
+        return result
+
+
+def _tmp_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, ".{}.{}.{}.tmp".format(name, os.getpid(), threading.get_ident()))
+
+
+def write_atomic(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = _tmp_path(path)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def move_atomic(src, dst):
+    """
+    同一文件系统内直接改名；跨文件系统时先复制到目标目录下的临时文件再改名
+    """
+    directory = os.path.dirname(dst)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        os.rename(src, dst)
+        return
+    except OSError:
+        if not os.path.exists(src):
+            raise
+    tmp_path = _tmp_path(dst)
+    try:
+        shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.remove(src)
@@ -0,0 +1,251 @@
+"""
+分阶段计时与计数
+
+convert_file / md2html 在 trace() 内执行时，各阶段耗时（毫秒，不含嵌套的子阶段）
+和计数（代码块、图片、表格、输入输出字节数等）记录在当前线程的 Trace 中；
+不在 trace() 内时 stage() 和 count() 什么也不做。
+
+宿主程序可以注册钩子收集同样的数据：
+
+    from maxpress import profiling
+
+    profiling.add_hook(lambda trace: print(trace["name"], trace["total"]))
+    with profiling.trace("article"):
+        maxpress.md2html(text)
+
+钩子收到的 trace 为 {"name": ..., "total": 毫秒, "stages": {...}, "counters": {...}}。
+
+代码高亮缓存和块级渲染缓存的命中次数按进程统计，不属于单篇文档：由 add_cache_counters()
+累加（批量转换时由主进程合并各工作进程的计数），Profile 的汇总中为 "caches"。
+"""
+import os
+import json
+import hashlib
+import threading
+from time import perf_counter
+
+_local = threading.local()
+_hooks = []
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.counters = {}
+        self._stack = []
+        self._mark = self._started = perf_counter()
+        self.total = None
+
+    def _switch(self):
+        now = perf_counter()
+        if self._stack:
+            top = self._stack[-1]
+            self.stages[top] = self.stages.get(top, 0.0) + now - self._mark
+        self._mark = now
+
+    def enter(self, name):
+        self._switch()
+        self._stack.append(name)
+
+    def exit(self):
+        self._switch()
+        self._stack.pop()
+
+    def finish(self):
+        self.total = perf_counter() - self._started
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "total": round(self.total * 1000, 3),
+            "stages": {k: round(v * 1000, 3) for k, v in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+
+def current():
+    return getattr(_local, "trace", None)
+
+
+class stage:
+    """
+    with stage("parse"): ...，嵌套的阶段单独计时
+    """
+
+    __slots__ = ("trace", "name")
+
+    def __init__(self, name):
+        self.trace = current()
+        self.name = name
+
+    def __enter__(self):
+        if self.trace is not None:
+            self.trace.enter(self.name)
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            self.trace.exit()
+
+
+def count(name, n=1):
+    trace = current()
+    if trace is not None:
+        trace.counters[name] = trace.counters.get(name, 0) + n
+
+
+class trace:
+    """
+    在当前线程中记录一篇文档的转换；emit 为真时结束后交给已注册的钩子，
+    否则由调用方通过 as_dict() 取出结果（例如从工作进程传回主进程后再 emit）
+    """
+
+    def __init__(self, name, emit=True):
+        self.trace = Trace(name)
+        self.emit = emit
+        self._outer = None
+
+    def __enter__(self):
+        self._outer = current()
+        _local.trace = self.trace
+        return self.trace
+
+    def __exit__(self, exc_type, *exc):
+        self.trace.finish()
+        _local.trace = self._outer
+        if exc_type is not None:
+            self.trace.counters["failed"] = 1
+        if self.emit:
+            emit(self.trace.as_dict())
+
+
+def add_hook(hook):
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def active():
+    return bool(_hooks)
+
+
+def emit(trace):
+    for hook in list(_hooks):
+        hook(trace)
+
+
+def cache_counters():
+    """
+    当前进程中代码高亮缓存和块级渲染缓存的累计命中、未命中次数
+    """
+    from maxpress.fragments import fragment_cache
+    from mistletoe_contrib.pygments_renderer import highlight_cache
+
+    counters = {}
+    for name, cache in (("highlight_cache", highlight_cache), ("fragment_cache", fragment_cache)):
+        stats = cache.stats()
+        counters[name] = {k: stats[k] for k in ("hits", "disk_hits", "misses") if k in stats}
+    return counters
+
+
+def since(counters, baseline):
+    """
+    counters 相对于更早取得的 baseline 的增量
+    """
+    return {
+        name: {k: n - baseline.get(name, {}).get(k, 0) for k, n in values.items()}
+        for name, values in counters.items()
+    }
+
+
+def add_cache_counters(counters):
+    with _caches_lock:
+        for name, values in counters.items():
+            total = _caches.setdefault(name, {})
+            for k, n in values.items():
+                total[k] = total.get(k, 0) + n
+
+
+def cache_totals():
+    with _caches_lock:
+        return {name: dict(values) for name, values in _caches.items()}
+
+
+def percentile(values, p):
+    """
+    最近秩法
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+class Profile:
+    """
+    --profile 使用的钩子：把每篇文档的 trace 写到 directory 下，并汇总整个批次
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.traces = []
+        self._lock = threading.Lock()
+
+    def __call__(self, trace):
+        with self._lock:
+            self.traces.append(trace)
+        if self.directory:
+            name = str(trace["name"])
+            digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+            filename = "{}.{}.json".format(os.path.basename(name) or "trace", digest)
+            self._write(filename, trace)
+
+    def _write(self, filename, obj):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, filename), "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+
+    def summary(self, slowest=10):
+        with self._lock:
+            traces = list(self.traces)
+        stage_names = sorted({name for t in traces for name in t["stages"]})
+        stages = {}
+        for name in stage_names:
+            values = [t["stages"].get(name, 0.0) for t in traces]
+            stages[name] = {
+                "total": round(sum(values), 3),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "max": max(values),
+            }
+        counters = {}
+        for t in traces:
+            for name, n in t["counters"].items():
+                counters[name] = counters.get(name, 0) + n
+        totals = [t["total"] for t in traces]
+        return {
+            "files": len(traces),
+            "total": round(sum(totals), 3),
+            "p50": percentile(totals, 50),
+            "p90": percentile(totals, 90),
+            "p99": percentile(totals, 99),
+            "stages": stages,
+            "counters": counters,
+            "caches": cache_totals(),
+            "slowest": [
+                {"name": t["name"], "total": t["total"], "stages": t["stages"]}
+                for t in sorted(traces, key=lambda t: -t["total"])[:slowest]
+            ],
+        }
+
+    def save(self):
+        summary = self.summary()
+        if self.directory:
+            self._write("summary.json", summary)
+        return summary
@@ -1,15 +1,126 @@
 import os
-from mistletoe import Document
+import re
+import threading
+from mistletoe import Document, block_token, span_token
 
-from mistletoe_contrib.text_renderer import TextRenderer
-from mistletoe_contrib.mathjax import MathJaxRenderer
-from mistletoe_contrib.pygments_renderer import PygmentsRenderer
+from mistletoe_contrib.text_renderer import TextRenderer, transform
+from mistletoe_contrib.static_math import StaticMathRenderer, current_format, math_tokens
+from mistletoe_contrib.pygments_renderer import PygmentsRenderer, highlight_cache
 from mistletoe_contrib.toc_renderer import TOCRenderer
 
+from maxpress import profiling
+
 HOSTNAME = os.getenv('HOSTNAME')
+# mistletoe 把可用的词法单元类型和正在解析的文档放在模块级变量中，
+# 创建渲染器、解析文档都会修改它们；多个线程同时转换时这一步需要串行
+parse_lock = threading.RLock()
+IMG_WRAPPER = '<section class="img-wrapper">{}</section>'
+TBL_WRAPPER = '<section class="tbl-wrapper">{}</section>'
+
+
+def fix_li(html):
+    """
+    修正粘贴到微信编辑器时列表格式丢失的问题
+    """
+    result = re.sub(
+        r"<li>(.*?)</li>", r"<li><span>\1</span></li>", html, flags=re.MULTILINE
+    )
+    return result
+
+
+def fix_img(html):
+    """
+    修正HTML图片大小自适应问题
+    """
+    result = re.sub(
+        r"(<p>)*?<img([\s\S]*?)>(</p>)*?",
+        r'<section class="img-wrapper"><img\2></section>',
+        html,
+    )
+    return result
+
+
+def fix_tbl(html):
+    """
+    修正HTML表格左右留白问题
+    """
+    result = re.sub(
+        r"<table>([\s\S]*?)</table>",
+        r'<section class="tbl-wrapper"><table>\1</table></section>',
+        html,
+    )
+    return result
+
+
+class MixRender(TOCRenderer, PygmentsRenderer, StaticMathRenderer, TextRenderer):
+    """
+    渲染时直接生成适合微信编辑器的列表、图片和表格结构，
+    无需再对整个文档做 fix_li、fix_img、fix_tbl 替换
+    """
+
+    _wrap_images = True
+
+    def render_list_item(self, token):
+        rendered = super().render_list_item(token)
+        # 只包装单行的列表项，与 fix_li 的行为一致
+        if '\n' in rendered:
+            return rendered
+        return '<li><span>{}</span></li>'.format(rendered[4:-5])
+
+    def render_block_code(self, token):
+        profiling.count('code_blocks')
+        with profiling.stage('highlight'):
+            return super().render_block_code(token)
+
+    def render_image(self, token):
+        profiling.count('images')
+        rendered = super().render_image(token)
+        return IMG_WRAPPER.format(rendered) if self._wrap_images else rendered
+
+    def render_paragraph(self, token):
+        if self._has_raw_html(token):
+            # 段落中的原始 HTML 无法在渲染时处理，只对这一段做整体修正
+            self._wrap_images = False
+            try:
+                rendered = super().render_paragraph(token)
+            finally:
+                self._wrap_images = True
+            with profiling.stage('fix'):
+                return fix_tbl(fix_img(fix_li(rendered)))
+        rendered = super().render_paragraph(token)
+        # 图片外层的 section 不能放在 p 中
+        if rendered.startswith('<p><section class="img-wrapper">'):
+            return rendered[3:-4]
+        return rendered
 
+    @classmethod
+    def _has_raw_html(cls, token):
+        for child in token.children:
+            name = child.__class__.__name__
+            if name == 'HTMLSpan' or name == 'RawText' and '<' in child.content:
+                return True
+            if name not in ('RawText', 'InlineCode') and hasattr(child, 'children'):
+                if cls._has_raw_html(child):
+                    return True
+        return False
+
+    def render_table(self, token):
+        profiling.count('tables')
+        return TBL_WRAPPER.format(super().render_table(token))
+
+    @classmethod
+    def plain_text(cls, token):
+        # 目录和标题 id 使用与正文相同的 emoji、pangu 转换
+        return transform(super().plain_text(token))
+
+    def render_toc_item(self, text, anchor):
+        return '<span>{}</span>'.format(super().render_toc_item(text, anchor))
+
+    @staticmethod
+    def render_html_block(token):
+        with profiling.stage('fix'):
+            return fix_tbl(fix_img(fix_li(token.content)))
 
-class MixRender(TOCRenderer, PygmentsRenderer, MathJaxRenderer, TextRenderer):
     def render_link(self, token):
         template = '<a href="{href}"{title}{target}>{inner}</a>'
         href = self.escape_url(token.target)
@@ -29,11 +140,65 @@ class MixRender(TOCRenderer, PygmentsRenderer, MathJaxRenderer, TextRenderer):
         return template.format(href=href, title=title, inner=inner, target=target)
 
 
-def mistletoe_parse(text, toc=False):
-    doc = Document(text)
-    with MixRender() as renderer:
-        rendered = renderer.render(doc)
-        if toc:
-            toc = renderer.render(renderer.toc)
-            return f'<div id="toc">{toc}</div>' + rendered
-        return rendered
+def _paragraph(children):
+    token = object.__new__(block_token.Paragraph)
+    token.children = children
+    return token
+
+
+def _flatten_ordered_list(token):
+    """
+    把有序列表的每一项拆成以序号开头的普通段落
+    """
+    blocks = []
+    for item in token.children:
+        number = span_token.RawText(item.leader + ' ')
+        children = list(item.children)
+        if children and isinstance(children[0], block_token.Paragraph):
+            spans = [number] + list(children.pop(0).children)
+        else:
+            spans = [number]
+        blocks.append(_paragraph(spans))
+        blocks.extend(children)
+    return blocks
+
+
+def escape_ordered_lists(token):
+    """
+    将文档中的有序列表转化为带序号的普通段落（纯为适应微信中列表序号样式自动丢失的古怪现象），
+    代码块不受影响
+    """
+    children = getattr(token, 'children', None)
+    if not isinstance(children, list):
+        return token
+    result = []
+    for child in children:
+        if isinstance(child, block_token.List) and child.start is not None:
+            for block in _flatten_ordered_list(child):
+                result.append(escape_ordered_lists(block))
+        elif isinstance(child, block_token.BlockToken):
+            result.append(escape_ordered_lists(child))
+        else:
+            result.append(child)
+    token.children = result
+    return token
+
+
+def mistletoe_parse(text, toc=False, convert_list=False):
+    from maxpress import fragments
+
+    with parse_lock:
+        # 长文档只重新渲染缓存中没有的顶层块
+        if fragments.enabled(text):
+            rendered = fragments.render(text, toc=toc, convert_list=convert_list)
+            if rendered is not None:
+                return rendered
+        with math_tokens(current_format()):
+            doc = Document(text)
+        if convert_list:
+            escape_ordered_lists(doc)
+        with MixRender() as renderer:
+            rendered = renderer.render(doc)
+            if toc:
+                return f'<div id="toc">{renderer.render_toc()}</div>' + rendered
+            return rendered
@@ -0,0 +1,328 @@
+"""
+大文档分段并行转换
+
+md2html(..., workers=N) 遇到不小于 SECTION_BYTES 的文档时：
+
+1. 在主进程中只做一遍块级扫描（不解析行内元素），得到顶层块的起始行、
+   全文的链接引用定义和代码块语言；
+2. 在顶层块边界处把原文切成若干段，交给进程池分别解析、渲染、内联样式；
+3. 按原顺序拼接，结果与整篇串行转换完全相同。
+
+为保证结果相同：
+- 每段解析时注入全文的链接引用定义；列表中的定义在串行解析时只对其后的块可见，
+  遇到这种情况整篇改为串行转换；
+- 标题 id 在全文范围内去重：各段输出占位符，拼接时按原顺序替换；
+- 未标注语言的代码块按全文用到的语言判断，扫描时遗漏的语言（如列表中的代码块）
+  在渲染后核对，受影响的段落重新渲染；
+- 样式表中含有跨越顶层块的选择器（相邻、兄弟选择器或 :first-child 等结构伪类）、
+  某段的 HTML 标签未闭合或需要生成目录时，各段只并行渲染，整页在主进程中内联。
+"""
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from mistletoe import Document, block_token, span_token
+from mistletoe import block_tokenizer
+from mistletoe_contrib.static_math import current_format, math_tokens, mathjax_script
+from mistletoe_contrib.toc_renderer import slugify
+
+import maxpress
+from maxpress import profiling
+
+# 启用分段转换的最小文档字节数
+SECTION_BYTES = int(os.getenv("MAXPRESS_SECTION_BYTES", 512 * 1024))
+# 每段的最小字节数
+MIN_SECTION_BYTES = 32 * 1024
+
+START = "<!--maxpress-section-start-->"
+END = "<!--maxpress-section-end-->"
+
+# 不会作为顶层块出现的标签，其上的结构伪类不受分段影响
+_NESTED_TAGS = frozenset(["li", "tr", "td", "th", "thead", "tbody", "tfoot", "dd", "dt"])
+_STRUCTURAL = re.compile(r":(?:first|last|nth|nth-last|only)-(?:child|of-type)")
+_VOID_TAGS = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input",
+                        "link", "meta", "param", "source", "track", "wbr"])
+_tag = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^>]*?(/?)>")
+
+
+class _Root:
+    def __init__(self, footnotes=None):
+        self.footnotes = dict(footnotes or {})
+
+
+def _lines(text):
+    lines = text.splitlines(keepends=True)
+    return [line if line.endswith("\n") else line + "\n" for line in lines]
+
+
+def _fence_languages(parse_buffer):
+    for token_type, result in parse_buffer:
+        if token_type is block_token.CodeFence:
+            language = span_token.EscapeSequence.strip(result[1][2])
+            if language:
+                yield language
+        elif token_type is block_token.Quote:
+            yield from _fence_languages(result)
+
+
+def scan_blocks(lines):
+    """
+    块级扫描：返回各顶层块的起始行号、链接引用定义和代码块语言，与 Document 的解析过程一致
+    """
+    root = _Root()
+    block_token._root_node = span_token._root_node = root
+    try:
+        wrapper = block_tokenizer.FileWrapper(lines)
+        parse_buffer = block_tokenizer.ParseBuffer()
+        starts = []
+        line = wrapper.peek()
+        while line is not None:
+            start = wrapper._index + 1
+            for token_type in block_token._token_types:
+                if token_type.start(line):
+                    result = token_type.read(wrapper)
+                    if result is not None:
+                        parse_buffer.append((token_type, result))
+                        starts.append(start)
+                        break
+            else:
+                next(wrapper)
+            line = wrapper.peek()
+    finally:
+        block_token._root_node = span_token._root_node = None
+    return starts, root.footnotes, set(_fence_languages(parse_buffer))
+
+
+def split_sections(lines, starts, n_sections):
+    """
+    在顶层块的起始行处把 lines 切成大约 n_sections 段
+    """
+    total = sum(len(line) for line in lines)
+    target = max(total // max(n_sections, 1), MIN_SECTION_BYTES)
+    sections = []
+    begin, size = 0, 0
+    boundaries = set(starts)
+    for i, line in enumerate(lines):
+        if size >= target and i in boundaries:
+            sections.append(lines[begin:i])
+            begin, size = i, 0
+        size += len(line)
+    sections.append(lines[begin:])
+    return sections
+
+
+def _parse(lines, footnotes, lookahead=None):
+    """
+    lookahead 为下一块的第一行：列表项之后隔着空行出现另一种列表标记时，
+    mistletoe 把这一项当作松散的列表项，解析时需要看到下一块的第一行。
+    这一行与 lines 一起解析，它产生的词法单元随后去掉
+    """
+    doc = object.__new__(Document)
+    doc.footnotes = dict(footnotes)
+    block_token._root_node = span_token._root_node = doc
+    try:
+        with math_tokens(current_format()):
+            if lookahead is None:
+                doc.children = block_token.tokenize(lines)
+            else:
+                children = block_token.tokenize(list(lines) + [lookahead])
+                extra = len(block_token.tokenize([lookahead]))
+                doc.children = children[:len(children) - extra]
+    finally:
+        block_token._root_node = span_token._root_node = None
+    return doc
+
+
+def _unlabeled_code(token):
+    for child in getattr(token, "children", None) or ():
+        if not isinstance(child, block_token.BlockToken):
+            continue
+        if isinstance(child, (block_token.CodeFence, block_token.BlockCode)):
+            if not child.language:
+                return True
+        elif _unlabeled_code(child):
+            return True
+    return False
+
+
+def inline_safe(styles):
+    """
+    样式表中没有跨越顶层块的选择器时，各段可以分别内联
+    """
+    from maxpress.inliner import get_inliner
+
+    inliner = get_inliner()
+    for index, href in enumerate(maxpress.page_styles(styles)):
+        rules, _ = inliner._parse_style_rules(inliner._load_external(href), index)
+        for rule in rules:
+            selector = rule[1]
+            if "+" in selector or "~" in selector:
+                return False
+            for compound in re.split(r"\s*[\s>]\s*", selector.strip()):
+                if _STRUCTURAL.search(compound):
+                    tag = re.match(r"[a-zA-Z][\w-]*", compound)
+                    if not tag or tag.group().lower() not in _NESTED_TAGS:
+                        return False
+    return True
+
+
+def balanced(html):
+    stack = []
+    for closing, name, self_closing in _tag.findall(html):
+        name = name.lower()
+        if name in _VOID_TAGS or self_closing:
+            continue
+        if not closing:
+            stack.append(name)
+        elif not stack or stack.pop() != name:
+            return False
+    return not stack
+
+
+_styles = None
+
+
+def _placeholder_renderer(section, nonce):
+    """
+    标题 id 在全文范围内去重，各段先输出占位符，拼接时再替换为最终的 id
+    """
+    from maxpress.renderer import MixRender
+
+    class SectionRender(MixRender):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.slugs = []
+
+        def heading_id(self, text):
+            self.slugs.append(slugify(text))
+            return "{}-{}-{}-".format(nonce, section, len(self.slugs) - 1)
+
+    return SectionRender()
+
+
+def _init_worker(styles):
+    global _styles
+    _styles = styles
+    maxpress.md2html("", styles=styles)
+
+
+def render_section(lines, footnotes, languages, convert_list, section, nonce, lookahead=None):
+    """
+    解析并渲染一段，标题 id 为占位符；lookahead 为下一段的第一行
+    """
+    from maxpress.renderer import escape_ordered_lists
+
+    doc = _parse(lines, footnotes, lookahead)
+    if convert_list:
+        escape_ordered_lists(doc)
+    with _placeholder_renderer(section, nonce) as renderer:
+        actual = set(renderer._collect_languages(doc))
+        renderer._languages = tuple(sorted(languages))
+        renderer.footnotes.update(doc.footnotes)
+        inner = "\n".join(renderer.render(child) for child in doc.children)
+    return dict(
+        inner=inner,
+        children=len(doc.children),
+        footnotes=sorted(doc.footnotes),
+        languages=actual,
+        unlabeled=_unlabeled_code(doc),
+        slugs=renderer.slugs,
+        headings=renderer._headings,
+    )
+
+
+def inline_section(inner, title, poster, banner):
+    """
+    打包、内联一段，返回内联结果被两个标记分开的三部分；HTML 标签未闭合时返回 None
+    """
+    if not balanced(inner):
+        return None
+    from maxpress.inliner import get_inliner
+
+    packed = maxpress.pack_html(START + inner + END, title, _styles, poster, banner)
+    result = get_inliner().transform(packed)
+    begin, end = result.find(START), result.rfind(END)
+    if not 0 <= begin < end:
+        return None
+    return result[:begin], result[begin + len(START):end], result[end + len(END):]
+
+
+def md2html(text, title="", styles=None, poster="", banner="", convert_list=True,
+            toc=False, workers=None):
+    from maxpress.renderer import MixRender, parse_lock
+
+    def serial():
+        return maxpress.md2html(text, title, styles, poster, banner, convert_list, toc)
+
+    lines = _lines(text)
+    with profiling.stage("scan"), parse_lock:
+        starts, footnotes, languages = scan_blocks(lines)
+    workers = max(1, workers or os.cpu_count() or 1)
+    sections = split_sections(lines, starts, workers * 4)
+    if len(sections) == 1:
+        return serial()
+
+    suffix = "\n" + mathjax_script(current_format())
+    nonce = "mxp" + uuid.uuid4().hex
+    placeholder = re.compile(re.escape(nonce) + r"-\d+-\d+-")
+
+    with ProcessPoolExecutor(
+        min(workers, len(sections)), initializer=_init_worker, initargs=(styles,)
+    ) as executor:
+
+        def submit(i, languages):
+            lookahead = sections[i + 1][0] if i + 1 < len(sections) else None
+            return executor.submit(render_section, sections[i], footnotes, languages,
+                                   convert_list, i, nonce, lookahead)
+
+        with profiling.stage("sections"):
+            futures = [submit(i, languages) for i in range(len(sections))]
+            results = [future.result() for future in futures]
+
+            # 列表中的链接引用定义：改为串行
+            if any(set(r["footnotes"]) != set(footnotes) for r in results):
+                return serial()
+            # 扫描时遗漏了语言：重新渲染含有未标注语言代码块的段落
+            actual = set().union(*(r["languages"] for r in results))
+            if actual != languages:
+                redo = {i: submit(i, actual) for i, r in enumerate(results) if r["unlabeled"]}
+                for i, future in redo.items():
+                    results[i] = future.result()
+
+        parts = [r for r in results if r["children"]]
+        if not parts or not results[-1]["children"]:
+            # 末段只有链接引用定义等没有输出的块，MathJax 脚本无处附加
+            return serial()
+
+        # 按全文顺序给标题分配 id
+        with parse_lock, MixRender() as renderer:
+            ids = {}
+            for i, r in enumerate(results):
+                for k, slug in enumerate(r["slugs"]):
+                    ids["{}-{}-{}-".format(nonce, i, k)] = renderer.heading_id(slug)
+            headings = [(level, text, ids[anchor])
+                        for r in results for level, text, anchor in r["headings"]]
+            toc_html = renderer.render_toc(headings) if toc else ""
+        inners = [placeholder.sub(lambda m: ids[m.group()], r["inner"]) for r in parts]
+        inners[-1] += suffix
+
+        # 目录需要和正文一起内联
+        if not toc and inline_safe(styles):
+            with profiling.stage("inline"):
+                futures = [executor.submit(inline_section, inner, title, poster, banner)
+                           for inner in inners]
+                contents = [future.result() for future in futures]
+            if all(contents):
+                # 头部取自第一段，尾部取自最后一段
+                return contents[0][0] + "\n".join(c[1] for c in contents) + contents[-1][2]
+
+    inner_html = "\n".join(inners)
+    if toc:
+        inner_html = '<div id="toc">{}</div>'.format(toc_html) + inner_html
+    with profiling.stage("pack"):
+        packed = maxpress.pack_html(inner_html, title, styles, poster, banner)
+    from maxpress.inliner import get_inliner
+
+    with profiling.stage("inline"):
+        return get_inliner().transform(packed)
@@ -0,0 +1,192 @@
+"""
+本地 HTTP 渲染服务
+
+    maxpress serve --port 8000
+
+POST /render  请求体为 JSON {"markdown": "...", "title": "..."}，或直接是 markdown 文本
+              （此时标题通过 ?title= 传入），返回内联样式后的 HTML
+POST /batch   请求体为 JSON {"documents": [{"id": ..., "markdown": ..., "title": ...}, ...]}，
+              返回 {"results": [{"id": ..., "html": ...} 或 {"id": ..., "error": ...}, ...]}
+GET  /health  健康检查
+
+渲染在固定大小的进程池中进行，每个进程只加载一次配置和样式表，并在启动时预热渲染器和内联器；
+每个请求的耗时（毫秒）写在 X-Render-Time 响应头中。
+请求格式不对时返回 400，渲染过程中出错返回 500（/batch 中单篇的错误写在该篇的结果里）。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import maxpress
+
+_config = None
+_styles = None
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _init_worker(styles):
+    global _config, _styles
+    _config, _styles = maxpress.load_config_and_css(styles)
+    # 预热：创建渲染器、加载并解析样式表
+    render_document({"markdown": ""})
+
+
+def parse_document(doc):
+    """
+    检查请求中的一篇文档，返回 {"id", "markdown", "title"}
+    """
+    if not isinstance(doc, dict):
+        raise BadRequest("document must be a JSON object")
+    markdown, title = doc.get("markdown", ""), doc.get("title", "")
+    if not isinstance(markdown, str):
+        raise BadRequest("markdown must be a string")
+    if not isinstance(title, str):
+        raise BadRequest("title must be a string")
+    return {"id": doc.get("id"), "markdown": markdown, "title": title}
+
+
+def parse_json(body):
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise BadRequest("invalid JSON: {}".format(e))
+
+
+def render_document(doc):
+    return maxpress.convert_markdown(doc["markdown"], doc.get("title", ""), _config, _styles)
+
+
+def _render_safely(doc):
+    try:
+        return {"id": doc.get("id"), "html": render_document(doc)}
+    except Exception as e:
+        return {"id": doc.get("id"), "error": repr(e)}
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    server_version = "maxpress"
+
+    def log_message(self, format, *args):
+        maxpress.log("[+] " + format % args)
+
+    def _send(self, status, body, content_type, started):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header(
+            "X-Render-Time", "{:.1f}".format((time.perf_counter() - started) * 1000)
+        )
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, obj, started):
+        self._send(status, json.dumps(obj, ensure_ascii=False), "application/json", started)
+
+    def _read_body(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length).decode("utf-8")
+        except ValueError as e:
+            raise BadRequest("unreadable request body: {}".format(e))
+
+    def do_GET(self):
+        started = time.perf_counter()
+        if urlparse(self.path).path == "/health":
+            self._send_json(200, {"status": "ok"}, started)
+        else:
+            self._send_json(404, {"error": "not found"}, started)
+
+    def do_POST(self):
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path not in ("/render", "/batch"):
+            self._send_json(404, {"error": "not found"}, started)
+            return
+        # 先检查请求格式，渲染中抛出的任何异常都属于服务端错误
+        try:
+            body = self._read_body()
+            if url.path == "/render":
+                if "json" in (self.headers.get("Content-Type") or ""):
+                    doc = parse_document(parse_json(body))
+                else:
+                    title = parse_qs(url.query).get("title", [""])[0]
+                    doc = {"markdown": body, "title": title}
+            else:
+                request = parse_json(body)
+                if not isinstance(request, dict) or not isinstance(
+                    request.get("documents"), list
+                ):
+                    raise BadRequest('expected {"documents": [...]}')
+                docs = [parse_document(doc) for doc in request["documents"]]
+        except BadRequest as e:
+            self._send_json(400, {"error": str(e)}, started)
+            return
+
+        try:
+            if url.path == "/render":
+                html = self.server.pool.submit(render_document, doc).result()
+                self._send(200, html, "text/html", started)
+            else:
+                results = list(self.server.pool.map(_render_safely, docs))
+                self._send_json(200, {"results": results}, started)
+        except Exception as e:
+            self._send_json(500, {"error": repr(e)}, started)
+
+
+class RenderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, styles=None, workers=None):
+        super().__init__(address, RenderHandler)
+        # 先在主进程中编译好样式表，工作进程直接命中缓存
+        maxpress.load_config_and_css(styles)
+        self.pool = ProcessPoolExecutor(
+            workers or os.cpu_count() or 1,
+            initializer=_init_worker,
+            initargs=(styles,),
+        )
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+
+def serve(host="127.0.0.1", port=8000, styles=None, workers=None):
+    server = RenderServer((host, port), styles=styles, workers=workers)
+    maxpress.log("[+] 渲染服务已启动: http://{}:{}".format(*server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="maxpress serve")
+    parser.add_argument("--host", default="127.0.0.1", help="bind address")
+    parser.add_argument("--port", type=int, default=8000, help="bind port")
+    parser.add_argument("--workers", type=int, help="render processes")
+    parser.add_argument("--styles", nargs="*", help="css file path")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="load remote stylesheets only from the local cache",
+    )
+    args = parser.parse_args(argv)
+    if args.offline:
+        os.environ["MAXPRESS_OFFLINE"] = "1"
+    serve(args.host, args.port, styles=args.styles, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
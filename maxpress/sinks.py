@@ -0,0 +1,208 @@
+"""
+批量转换的输出目标
+
+convert_all 的 dst 为以下扩展名时，整批结果写入单个文件，不再逐篇创建文件和目录：
+
+    .zip                        zip 包，成员为 html/<相对路径>.html、archive/<相对路径>.md
+    .tar .tar.gz .tgz .tar.xz   tar 包，成员同上
+    .sqlite .sqlite3 .db        SQLite 数据库，以源文档的相对路径为主键
+
+渲染结果由主进程中单独的写入线程交给输出目标，工作进程继续渲染，不等待写入。
+其余 dst 仍按目录处理，由各工作进程直接写入文件。
+
+自定义输出目标只需实现 write(key, html)、archive(key, filepath)、locate(key, archive) 和 close()，
+key 为源文档相对于 src 的路径，通过 convert_all(..., sink=...) 传入。
+"""
+import os
+import io
+import time
+import queue
+import sqlite3
+import tarfile
+import zipfile
+import threading
+import traceback
+
+from maxpress.naming import split_ext
+
+_TAR_MODES = {".tar": "w", ".tar.gz": "w:gz", ".tgz": "w:gz", ".tar.bz2": "w:bz2",
+              ".tar.xz": "w:xz"}
+_SQLITE_EXTS = (".sqlite", ".sqlite3", ".db")
+
+
+def html_name(key):
+    return "html/" + split_ext(key)[0] + ".html"
+
+
+def archive_name(key):
+    return "archive/" + key
+
+
+def _read_bytes(filepath):
+    with open(filepath, "rb") as f:
+        return f.read()
+
+
+class ZipSink:
+    def __init__(self, path):
+        self.path = path
+        self._zip = None
+
+    def _open(self):
+        if self._zip is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._zip = zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED)
+        return self._zip
+
+    def locate(self, key, archive=False):
+        return os.path.join(self.path, archive_name(key) if archive else html_name(key))
+
+    def write(self, key, html):
+        self._open().writestr(html_name(key), html.encode("utf-8"))
+
+    def archive(self, key, filepath):
+        self._open().writestr(archive_name(key), _read_bytes(filepath))
+
+    def close(self):
+        self._open().close()
+
+
+class TarSink:
+    def __init__(self, path, mode="w"):
+        self.path = path
+        self.mode = mode
+        self._tar = None
+
+    def _open(self):
+        if self._tar is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._tar = tarfile.open(self.path, self.mode)
+        return self._tar
+
+    def _add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = time.time()
+        self._open().addfile(info, io.BytesIO(data))
+
+    def locate(self, key, archive=False):
+        return os.path.join(self.path, archive_name(key) if archive else html_name(key))
+
+    def write(self, key, html):
+        self._add(html_name(key), html.encode("utf-8"))
+
+    def archive(self, key, filepath):
+        self._add(archive_name(key), _read_bytes(filepath))
+
+    def close(self):
+        self._open().close()
+
+
+class SqliteSink:
+    """
+    documents(path, html, updated) 和 archive(path, markdown, archived) 两张表，
+    path 为源文档的相对路径；整批在一个事务中写入，已有的同名记录被替换
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+
+    def _open(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 只在写入线程中使用，关闭时写入线程已经结束
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS documents "
+                "(path TEXT PRIMARY KEY, html TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS archive "
+                "(path TEXT PRIMARY KEY, markdown TEXT NOT NULL, archived REAL NOT NULL)"
+            )
+        return self._db
+
+    def locate(self, key, archive=False):
+        return "{}#{}/{}".format(self.path, "archive" if archive else "documents", key)
+
+    def write(self, key, html):
+        self._open().execute(
+            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", (key, html, time.time())
+        )
+
+    def archive(self, key, filepath):
+        markdown = _read_bytes(filepath).decode("utf-8")
+        self._open().execute(
+            "INSERT OR REPLACE INTO archive VALUES (?, ?, ?)", (key, markdown, time.time())
+        )
+
+    def close(self):
+        db = self._open()
+        db.commit()
+        db.close()
+
+
+def open_sink(dst):
+    """
+    按扩展名返回对应的输出目标，dst 为目录时返回 None
+    """
+    lower = dst.lower()
+    if lower.endswith(".zip"):
+        return ZipSink(dst)
+    for ext, mode in _TAR_MODES.items():
+        if lower.endswith(ext):
+            return TarSink(dst, mode)
+    if lower.endswith(_SQLITE_EXTS):
+        return SqliteSink(dst)
+    return None
+
+
+class SinkWriter:
+    """
+    在单独的线程中把结果交给输出目标；队列满时 put 阻塞，限制积压的结果数。
+    存档时先写入 HTML 和源文档，成功后才删除源文档。
+    """
+
+    def __init__(self, sink, max_pending=64):
+        self.sink = sink
+        self.errors = []
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name="maxpress-sink", daemon=True)
+        self._thread.start()
+
+    def put(self, key, html, filepath, archive=False):
+        """
+        返回结果在输出目标中的位置（存档时为源文档的位置）
+        """
+        self._queue.put((key, html, filepath, archive))
+        return self.sink.locate(key, archive)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            key, html, filepath, archive = item
+            try:
+                self.sink.write(key, html)
+                if archive:
+                    self.sink.archive(key, filepath)
+                    os.remove(filepath)
+            except Exception:
+                self.errors.append((filepath, traceback.format_exc()))
+
+    def close(self):
+        """
+        等待队列写完并关闭输出目标，返回 [(filepath, traceback)] 形式的错误列表
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self.sink.close()
+        return self.errors
@@ -0,0 +1,162 @@
+"""
+NDJSON 流式转换
+
+    cat articles.ndjson | maxpress stream --workers 4 > results.ndjson
+
+标准输入每行一个 JSON 对象：
+    {"id": ..., "title": "...", "markdown": "...", "config": {"poster_url": "...", ...}}
+其中 config 可选，只能覆盖 RENDER_KEYS 中不影响样式表的配置项。
+
+标准输出每行一个结果，顺序与输入不一定相同，用 id 对应：
+    {"id": ..., "html": "..."}
+    {"id": ..., "line": 行号, "error": {"type": "...", "message": "..."}}
+
+输入边读边转换，同时进行的文档数不超过 --max-pending，超过时暂停读取；
+全程不写临时文件。
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+
+import maxpress
+
+# 可以按文档覆盖的配置项
+RENDER_KEYS = ("poster_url", "banner_url", "convert_list", "toc")
+
+_config = None
+_styles = None
+
+
+def _init_worker(styles):
+    global _config, _styles
+    _config, _styles = maxpress.load_config_and_css(styles)
+
+
+def _error(record_id, line_no, e):
+    return {
+        "id": record_id,
+        "line": line_no,
+        "error": {"type": type(e).__name__, "message": str(e)},
+    }
+
+
+def render_record(record):
+    if not isinstance(record, dict):
+        raise TypeError("record must be a JSON object")
+    markdown = record.get("markdown")
+    if not isinstance(markdown, str):
+        raise TypeError("markdown must be a string")
+    overrides = record.get("config") or {}
+    unknown = sorted(set(overrides) - set(RENDER_KEYS))
+    if unknown:
+        raise ValueError("config keys not overridable: {}".format(", ".join(unknown)))
+    config = dict(_config, **overrides)
+    return maxpress.convert_markdown(markdown, record.get("title") or "", config, _styles)
+
+
+def _render_line(line_no, record):
+    record_id = record.get("id") if isinstance(record, dict) else None
+    try:
+        return {"id": record_id, "html": render_record(record)}
+    except Exception as e:
+        return _error(record_id, line_no, e)
+
+
+class _Writer:
+    def __init__(self, output):
+        self.output = output
+        self.written = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def write(self, result):
+        line = json.dumps(result, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.output.write(line)
+            self.output.flush()
+            self.written += 1
+            self.failed += "error" in result
+
+
+def run_stream(input=None, output=None, styles=None, workers=None, max_pending=None):
+    """
+    逐行读取 input 中的记录并把结果写入 output，返回 (结果数, 失败数)
+    """
+    input = input or sys.stdin
+    output = output or sys.stdout
+    workers = max(1, workers or os.cpu_count() or 1)
+    max_pending = max(1, max_pending or workers * 4)
+    writer = _Writer(output)
+
+    # 先在主进程中编译好样式表，工作进程直接命中缓存
+    _init_worker(styles)
+    if workers == 1:
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(styles,))
+    slots = threading.BoundedSemaphore(max_pending)
+
+    def on_done(line_no, record_id, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            # 工作进程异常退出等
+            result = _error(record_id, line_no, e)
+        writer.write(result)
+        slots.release()
+
+    try:
+        for line_no, line in enumerate(input, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                writer.write(_error(None, line_no, e))
+                continue
+            record_id = record.get("id") if isinstance(record, dict) else None
+            slots.acquire()
+            if executor is None:
+                future = Future()
+                future.set_result(_render_line(line_no, record))
+            else:
+                future = executor.submit(_render_line, line_no, record)
+            future.add_done_callback(
+                lambda f, n=line_no, i=record_id: on_done(n, i, f)
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+    return writer.written, writer.failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="maxpress stream")
+    parser.add_argument("--workers", type=int, help="render processes")
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        help="documents in flight before reading stops, default 4 per worker",
+    )
+    parser.add_argument("--styles", nargs="*", help="css file path")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="load remote stylesheets only from the local cache",
+    )
+    args = parser.parse_args(argv)
+    if args.offline:
+        os.environ["MAXPRESS_OFFLINE"] = "1"
+    written, failed = run_stream(
+        styles=args.styles, workers=args.workers, max_pending=args.max_pending
+    )
+    maxpress.log("[+] 已输出{}篇，失败{}篇".format(written, failed))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
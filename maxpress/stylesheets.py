@@ -0,0 +1,188 @@
+"""
+外部样式表加载
+
+- 共用一个带连接池的 requests.Session，并设置超时
+- 下载的内容按 sha256 保存在 $HOME/.cache/maxpress/stylesheets 中，
+  之后通过 ETag / Last-Modified 条件请求验证是否更新
+- 离线模式（--offline 或 MAXPRESS_OFFLINE=1）只使用缓存，不访问网络
+- 同一个加载器在批次内对每个 url 最多请求一次；批量转换时主进程预先加载，
+  再把结果交给工作进程（见 prefetch、seed），无论以 fork 还是 spawn 创建进程都不会重复请求
+"""
+import os
+import json
+import hashlib
+import threading
+
+import maxpress
+
+
+class StylesheetUnavailable(Exception):
+    pass
+
+
+class StylesheetLoader:
+    def __init__(self, cache_dir, offline=False, timeout=10):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.timeout = timeout
+        self._session = None
+        self._loaded = {}
+        self._fetching = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def _meta_path(self, url):
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json"
+        return os.path.join(self.cache_dir, "index", name)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, "blobs", digest + ".css")
+
+    def _read_meta(self, url):
+        try:
+            with open(self._meta_path(url), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(self._blob_path(meta["digest"])):
+            return None
+        return meta
+
+    def _read_blob(self, meta):
+        with open(self._blob_path(meta["digest"]), "rb") as f:
+            return f.read().decode(meta.get("encoding") or "utf-8")
+
+    @staticmethod
+    def _write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _store(self, url, response):
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self._blob_path(digest)
+        if not os.path.isfile(blob):
+            self._write(blob, content)
+        meta = {
+            "url": url,
+            "digest": digest,
+            "encoding": response.encoding or "utf-8",
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        self._write(self._meta_path(url), json.dumps(meta).encode("utf-8"))
+        return meta
+
+    def fetch(self, url):
+        """
+        下载或从缓存读取样式表，不经过批次内的内存缓存
+        """
+        meta = self._read_meta(url)
+        if self.offline:
+            if meta is None:
+                raise StylesheetUnavailable("{} is not cached (offline mode)".format(url))
+            return self._read_blob(meta)
+
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and meta:
+                return self._read_blob(meta)
+            response.raise_for_status()
+        except Exception as e:
+            # 网络不可用时退回到缓存的版本
+            if meta:
+                return self._read_blob(meta)
+            raise StylesheetUnavailable("{}: {!r}".format(url, e))
+        return self._read_blob(self._store(url, response))
+
+    def load(self, url):
+        with self._lock:
+            if url in self._loaded:
+                return self._loaded[url]
+            fetching = self._fetching.setdefault(url, threading.Lock())
+        # 多个线程同时加载同一个 url 时只请求一次，其余等待结果
+        with fetching:
+            with self._lock:
+                if url in self._loaded:
+                    return self._loaded[url]
+            text = self.fetch(url)
+            with self._lock:
+                self._loaded[url] = text
+        return text
+
+    def seed(self, texts):
+        """
+        把其他进程已经加载的 {url: 样式表文本} 作为本批次的结果
+        """
+        with self._lock:
+            self._loaded.update(texts)
+
+    def reset(self):
+        """
+        开始新的批次时清空内存中的结果，下次加载时重新验证
+        """
+        with self._lock:
+            self._loaded.clear()
+            self._fetching.clear()
+
+
+_loader = None
+
+
+def get_loader():
+    global _loader
+    if _loader is None:
+        _loader = StylesheetLoader(
+            os.path.join(maxpress.CACHE_ROOT, "stylesheets"),
+            offline=bool(os.getenv("MAXPRESS_OFFLINE")),
+        )
+    return _loader
+
+
+def reset_loader():
+    if _loader is not None:
+        _loader.reset()
+
+
+def is_remote(href):
+    return href.startswith(("http://", "https://", "//"))
+
+
+def prefetch(hrefs):
+    """
+    预先加载其中的远程样式表，返回 {url: 样式表文本}；在创建工作进程前调用，
+    结果经由工作进程的初始化参数交给各进程的加载器（seed）
+    """
+    remote = [href for href in hrefs if href and is_remote(href)]
+    texts = {}
+    if not remote:
+        return texts
+    loader = get_loader()
+    for href in remote:
+        url = "http:" + href if href.startswith("//") else href
+        try:
+            texts[url] = loader.load(url)
+        except StylesheetUnavailable as e:
+            # 留给转换时按原样报错
+            maxpress.log("[!] 样式表加载失败: {}".format(e))
+    return texts
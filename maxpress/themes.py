@@ -0,0 +1,165 @@
+"""
+多主题
+
+主题是 $HOME/.config/maxpress/themes/<name>.json 中的部分配置，覆盖 config.json 中的同名项，
+既可以是样式变量（theme_color、align 等），也可以是 banner_url、poster_url 等非样式项。
+
+convert_all 按以下顺序为每篇文档确定主题：
+1. 文档开头 front matter 中的 theme: <name>
+       ---
+       theme: account-a
+       ---
+2. 源目录中离文档最近的 .maxpress-theme.json，内容同样是部分配置，
+   也可以只写 {"theme": "<name>"} 引用已有主题
+3. 都没有时使用 config.json
+
+配置变量相同的主题只编译一次：ThemeRegistry 在进程内按 LESS 变量记住编译结果，
+编译好的 CSS 另外缓存在 $HOME/.cache/maxpress/css/ 中。LESS 在内存中编译，不写入包目录。
+"""
+import os
+import re
+import threading
+
+import maxpress
+
+THEMES_DIR = os.path.expandvars("$HOME/.config/maxpress/themes")
+DIR_THEME_NAME = ".maxpress-theme.json"
+
+_front_matter = re.compile(r"\A---[ \t]*\n((?:[ \t]*[\w-]+[ \t]*:.*\n)+?)---[ \t]*(?:\n|\Z)")
+_meta_line = re.compile(r"^[ \t]*([\w-]+)[ \t]*:[ \t]*(.*?)[ \t]*$")
+
+
+def is_theme_file(path):
+    """
+    path 是否为主题文件：THEMES_DIR 下的文件或 .maxpress-theme.json，变化后需要重新解析主题
+    """
+    path = os.path.abspath(path)
+    themes_dir = os.path.abspath(THEMES_DIR)
+    return (os.path.basename(path) == DIR_THEME_NAME
+            or path == themes_dir or path.startswith(themes_dir + os.sep))
+
+
+def split_front_matter(text):
+    """
+    返回 (front matter 中的键值, 去掉 front matter 后的正文)；没有 front matter 时原样返回正文
+    """
+    m = _front_matter.match(text)
+    if not m:
+        return {}, text
+    meta = {}
+    for line in m.group(1).splitlines():
+        key, value = _meta_line.match(line).groups()
+        meta[key] = value.strip("'\"")
+    return meta, text[m.end():]
+
+
+def read_front_matter(filepath, max_lines=50):
+    """
+    只读取文件开头的 front matter
+    """
+    lines = []
+    with open(filepath, encoding="utf-8") as f:
+        for _ in range(max_lines):
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line)
+            if len(lines) > 1 and line.strip() == "---" or lines[0].strip() != "---":
+                break
+    return split_front_matter("".join(lines))[0]
+
+
+def merge_config(base, overrides):
+    """
+    overrides 中的嵌套项（如 align）只覆盖其中出现的子项
+    """
+    config = dict(base)
+    for key, value in overrides.items():
+        if key == "theme":
+            continue
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key] = dict(config[key], **value)
+        else:
+            config[key] = value
+    return config
+
+
+def _read_json(path):
+    return maxpress.read_config(path)
+
+
+class ThemeRegistry:
+    """
+    为文档解析主题并编译对应的样式表；styles 为显式传入的样式表时，主题只影响非样式项
+    """
+
+    def __init__(self, config, styles=None, rebuild_css=False, themes_dir=THEMES_DIR):
+        self.config = config
+        self.styles = list(styles) if styles else None
+        self.rebuild_css = rebuild_css
+        self.themes_dir = themes_dir
+        self._themes = {}
+        self._dirs = {}
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def theme(self, name):
+        """
+        名为 name 的主题的部分配置
+        """
+        if name not in self._themes:
+            path = os.path.join(self.themes_dir, name + ".json")
+            if not re.match(r"^[\w.-]+$", name) or not os.path.isfile(path):
+                raise ValueError("unknown theme {!r}, expected {}".format(name, path))
+            self._themes[name] = _read_json(path)
+        return self._themes[name]
+
+    def _overrides(self, overrides):
+        if "theme" in overrides:
+            return merge_config(self.theme(overrides["theme"]), overrides)
+        return overrides
+
+    def _directory_theme(self, directory):
+        if directory not in self._dirs:
+            path = os.path.join(directory, DIR_THEME_NAME)
+            self._dirs[directory] = (
+                self._overrides(_read_json(path)) if os.path.isfile(path) else None
+            )
+        return self._dirs[directory]
+
+    def styles_for(self, config):
+        """
+        config 对应的样式表列表，LESS 变量相同的配置共用一次编译
+        """
+        if self.styles:
+            return self.styles
+        key = maxpress.less_variables(config)
+        with self._lock:
+            if key not in self._compiled:
+                self._compiled[key] = [maxpress.cached_css(config, self.rebuild_css)]
+            return self._compiled[key]
+
+    def resolve(self, filepath, root=None):
+        """
+        返回 filepath 使用的主题 (config, styles)，使用默认配置时返回 None；
+        root 为批量转换的源目录，在 filepath 所在目录到 root 之间查找 .maxpress-theme.json
+        """
+        overrides = None
+        name = read_front_matter(filepath).get("theme")
+        if name:
+            overrides = self.theme(name)
+        else:
+            directory = os.path.dirname(os.path.abspath(filepath))
+            root = os.path.abspath(root or directory)
+            while True:
+                overrides = self._directory_theme(directory)
+                if overrides is not None or directory == root:
+                    break
+                parent = os.path.dirname(directory)
+                if parent == directory or not parent.startswith(root):
+                    break
+                directory = parent
+        if not overrides:
+            return None
+        config = merge_config(self.config, overrides)
+        return config, self.styles_for(config)
@@ -0,0 +1,198 @@
+"""
+监视文件变化
+
+Linux 下使用 inotify，其他平台或 inotify 不可用时退回到定时轮询。
+监视的是文件所在目录而不是文件本身，这样编辑器以"写临时文件再改名"的方式保存时也能察觉。
+"""
+import os
+import sys
+import time
+import struct
+import select
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+)
+_event = struct.Struct("iIII")
+
+
+class _Targets:
+    """
+    记录要监视的文件和目录，判断一个路径是否需要上报
+    """
+
+    def __init__(self, paths):
+        self.files = set()
+        self.dirs = set()
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                self.dirs.add(path)
+            else:
+                self.files.add(path)
+
+    def wanted(self, path):
+        if path in self.files:
+            return True
+        return any(path == d or path.startswith(d + os.sep) for d in self.dirs)
+
+    def watch_dirs(self):
+        """
+        需要监视的目录：文件的父目录，以及监视目录下的所有子目录
+        """
+        result = {os.path.dirname(f) for f in self.files}
+        for d in self.dirs:
+            for root, _, _ in os.walk(d, followlinks=True):
+                result.add(root)
+        return {d for d in result if os.path.isdir(d)}
+
+
+class PollingWatcher:
+    def __init__(self, paths, interval=1.0):
+        self.targets = _Targets(paths)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        result = {}
+        paths = set(self.targets.files)
+        for d in self.targets.dirs:
+            for root, _, files in os.walk(d, followlinks=True):
+                paths.update(os.path.join(root, f) for f in files)
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            result[path] = (st.st_mtime_ns, st.st_size)
+        return result
+
+    def poll(self, timeout=None):
+        """
+        等待变化，返回发生变化的路径集合；timeout 为 None 时一直等到有变化为止
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.interval
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            time.sleep(delay)
+            current = self._scan()
+            changed = {
+                path
+                for path in set(current) | set(self.snapshot)
+                if current.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = current
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    def __init__(self, paths):
+        import ctypes
+        import ctypes.util
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.targets = _Targets(paths)
+        self.wds = {}
+        for d in self.targets.watch_dirs():
+            self._add_watch(d)
+
+    def _add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self.wds[wd] = path
+
+    def _read(self):
+        changed = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, length = _event.unpack_from(buf, offset)
+                offset += _event.size
+                name = buf[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # 事件队列溢出，无法知道具体文件，上报所有监视目标
+                    changed.update(self.targets.files | self.targets.dirs)
+                    continue
+                if wd not in self.wds:
+                    continue
+                path = os.path.join(self.wds[wd], os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and self.targets.wanted(path):
+                        self._add_watch(path)
+                    continue
+                if self.targets.wanted(path):
+                    changed.add(path)
+
+    def poll(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            changed = self._read() if ready else set()
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(paths):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(paths)
+
+
+def watch(paths, callback, debounce=0.3):
+    """
+    持续监视 paths，把一段时间内连续发生的变化合并后交给 callback
+    """
+    watcher = make_watcher(paths)
+    try:
+        while True:
+            changed = watcher.poll()
+            # 合并编辑器一次保存产生的多个事件
+            while True:
+                more = watcher.poll(debounce)
+                if not more:
+                    break
+                changed |= more
+            callback(changed)
+    finally:
+        watcher.close()
@@ -0,0 +1,121 @@
+"""
+Fast, bounded language detection for code blocks without a language.
+
+pygments.lexers.guess_lexer runs every lexer's analyse_text over the whole
+block, which takes seconds on long logs or data dumps. Cheap signals are
+checked first (shebang, file signatures, languages used elsewhere in the
+same document); guess_lexer only ever sees a bounded prefix, and anything
+undecided falls back to plain text.
+"""
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+from pygments.lexers import get_lexer_by_name as get_lexer, guess_lexer
+from pygments.util import ClassNotFound
+
+TEXT = 'text'
+
+_shebang = re.compile(r'^#!\s*(?:\S*/)?(?:env\s+(?:-\S+\s+)*)?([A-Za-z_][\w.+-]*)')
+_interpreters = {
+    'sh': 'bash', 'bash': 'bash', 'zsh': 'bash', 'ksh': 'bash', 'dash': 'bash',
+    'node': 'javascript', 'nodejs': 'javascript', 'deno': 'typescript',
+}
+_signatures = [
+    (re.compile(r'^<\?xml\b'), 'xml'),
+    (re.compile(r'^<\?php\b'), 'php'),
+    (re.compile(r'^<!DOCTYPE\s+html|^<html\b', re.I), 'html'),
+    (re.compile(r'^diff --git |^--- \S.*\n\+\+\+ \S|^Index: \S.*\n====', re.M), 'diff'),
+    (re.compile(r'^%PDF-|^%!PS'), TEXT),
+    (re.compile(r'^\s*[{\[]\s*"[^"\n]*"\s*:'), 'json'),
+]
+
+
+def _from_shebang(code):
+    m = _shebang.match(code)
+    if not m:
+        return None
+    name = re.sub(r'[\d.]+$', '', m.group(1)) or m.group(1)
+    name = _interpreters.get(name, name)
+    try:
+        return get_lexer(name).aliases[0]
+    except (ClassNotFound, IndexError):
+        return None
+
+
+def _from_signature(code):
+    for pattern, language in _signatures:
+        if pattern.search(code):
+            return language
+    return None
+
+
+def _from_document(prefix, languages):
+    best, best_score = None, 0.0
+    for language in languages:
+        try:
+            lexer = get_lexer(language)
+        except ClassNotFound:
+            continue
+        score = lexer.analyse_text(prefix)
+        if score > best_score:
+            best, best_score = lexer.aliases[0] if lexer.aliases else TEXT, score
+    return best
+
+
+def _from_guess(prefix):
+    try:
+        lexer = guess_lexer(prefix)
+    except ClassNotFound:
+        return TEXT
+    return lexer.aliases[0] if lexer.aliases else TEXT
+
+
+class LexerDetector:
+    """
+    Detects the language of unlabeled code blocks.
+
+    Args:
+        budget (int): number of leading characters examined by guess_lexer
+                      and by the document-language check;
+        maxsize (int): number of decisions cached, keyed on content hash.
+    """
+    def __init__(self, budget=2000, maxsize=4096):
+        self.budget = budget
+        self.maxsize = maxsize
+        self._decisions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def detect(self, code, languages=()):
+        """
+        Returns a lexer alias for `code`; `languages` are the languages
+        of other fenced blocks in the same document.
+        """
+        languages = tuple(sorted(set(languages)))
+        key = (hashlib.sha1(code.encode('utf-8')).hexdigest(), languages)
+        with self._lock:
+            if key in self._decisions:
+                self._decisions.move_to_end(key)
+                return self._decisions[key]
+
+        prefix = code[:self.budget]
+        language = (_from_shebang(prefix)
+                    or _from_signature(prefix)
+                    or _from_document(prefix, languages)
+                    or _from_guess(prefix))
+
+        with self._lock:
+            self._decisions[key] = language
+            while len(self._decisions) > self.maxsize:
+                self._decisions.popitem(last=False)
+        return language
+
+    def clear(self):
+        with self._lock:
+            self._decisions.clear()
+
+
+lexer_detector = LexerDetector(budget=int(os.getenv('HIGHLIGHT_GUESS_BUDGET', 2000)))
@@ -1,20 +1,147 @@
 import os
-from mistletoe import HTMLRenderer
+import hashlib
+import threading
+from collections import OrderedDict
+
+from mistletoe import HTMLRenderer, block_token
+import pygments
 from pygments import highlight
 from pygments.styles import get_style_by_name as get_style
-from pygments.lexers import get_lexer_by_name as get_lexer, guess_lexer
+from pygments.lexers import get_lexer_by_name as get_lexer
+from pygments.lexers.special import TextLexer
 from pygments.formatters.html import HtmlFormatter
+from pygments.util import ClassNotFound
 
+from mistletoe_contrib.lexer_detection import lexer_detector
 
-class PygmentsRenderer(HTMLRenderer):
-    formatter = HtmlFormatter()
-    formatter.noclasses = True
+# bump when the highlighted markup changes, so shared disk caches are not reused
+FORMAT_VERSION = 2
+
+
+class HighlightCache:
+    """
+    Caches highlighted code blocks keyed on (code, language, style name).
+
+    Keeps at most `maxsize` entries in an in-process LRU; when `directory`
+    is given, entries are also stored there so that several processes
+    (e.g. `convert_all` workers) can share them.
+    """
+    def __init__(self, maxsize=1024, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1('{}-{}'.format(pygments.__version__, FORMAT_VERSION).encode('utf-8'))
+        for part in key:
+            digest.update(b'\0' + str(part).encode('utf-8'))
+        return os.path.join(self.directory, digest.hexdigest() + '.html')
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key, render):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        path = self._disk_path(key) if self.directory else None
+        if path and os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                value = f.read()
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            value = render()
+            with self._lock:
+                self.misses += 1
+            if path:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(value)
+                os.replace(tmp_path, path)
+        if self.maxsize > 0:
+            self._remember(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return dict(hits=self.hits, disk_hits=self.disk_hits,
+                        misses=self.misses, size=len(self._entries),
+                        maxsize=self.maxsize)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
 
+
+highlight_cache = HighlightCache(
+    maxsize=int(os.getenv('HIGHLIGHT_CACHE_SIZE', 1024)),
+    directory=os.getenv('HIGHLIGHT_CACHE_DIR'),
+)
+
+
+_formatters = {}
+_formatters_lock = threading.Lock()
+
+
+def get_formatter(style):
+    """
+    Returns the inline-style HtmlFormatter for `style`. Formatters are
+    built once per style and shared; formatting never modifies them, so
+    renderers in different threads can use them concurrently.
+    """
+    with _formatters_lock:
+        if style not in _formatters:
+            _formatters[style] = HtmlFormatter(style=get_style(style), noclasses=True)
+        return _formatters[style]
+
+
+class PygmentsRenderer(HTMLRenderer):
     def __init__(self, *extras, style=os.getenv('HIGHLIGHT_CSS_NAME', 'autumn')):
         super().__init__(*extras)
-        self.formatter.style = get_style(style)
+        self.style_name = style
+        self.formatter = get_formatter(style)
+        self._languages = ()
+
+    def render_document(self, token):
+        """
+        Collects the languages of labeled fences first; they are hints
+        for detecting the language of unlabeled ones.
+        """
+        self._languages = tuple(self._collect_languages(token))
+        return super().render_document(token)
+
+    @classmethod
+    def _collect_languages(cls, token):
+        for child in getattr(token, 'children', None) or ():
+            if not isinstance(child, block_token.BlockToken):
+                continue
+            if isinstance(child, block_token.CodeFence) and child.language:
+                yield child.language
+            yield from cls._collect_languages(child)
 
     def render_block_code(self, token):
         code = token.children[0].content
-        lexer = get_lexer(token.language) if token.language else guess_lexer(code)
+        language = token.language or lexer_detector.detect(code, self._languages)
+        key = (code, language, self.style_name)
+        return highlight_cache.get(key, lambda: self._highlight(code, language))
+
+    def _highlight(self, code, language):
+        try:
+            lexer = get_lexer(language)
+        except ClassNotFound:
+            lexer = TextLexer()
         return highlight(code, lexer, self.formatter)
@@ -0,0 +1,189 @@
+"""
+Renders LaTeX math to static MathML or SVG at render time, so pages need
+no MathJax script (WeChat strips scripts anyway).
+
+The output format is chosen by MATH_FORMAT: unset keeps the MathJax
+script, 'mathml' uses the latex2mathml package, 'svg' runs
+MATH_SVG_COMMAND (default `tex2svg`, from mathjax-node-cli) once per
+formula.
+
+Only spans that look like formulas are parsed as math: inline `$...$`
+needs a non-space character right inside both dollars and no digit right
+after the closing one, so prose such as "$5 and $6" stays text.
+"""
+import os
+import re
+import shlex
+import contextlib
+import hashlib
+import subprocess
+from importlib import metadata
+
+from mistletoe import span_token
+from mistletoe import latex_token
+from mistletoe_contrib.mathjax import MathJaxRenderer
+from mistletoe_contrib.pygments_renderer import HighlightCache
+
+FORMATS = ('', 'mathml', 'svg')
+# bump when the generated markup changes, so shared disk caches are not reused
+FORMAT_VERSION = 1
+
+
+class Math(latex_token.Math):
+    """
+    latex_token.Math with the inline rules above; `$$...$$` is unchanged.
+    """
+    pattern = re.compile(r'\$\$[^$]+?\$\$|\$(?!\s)[^$]+?(?<!\s)\$(?!\d)')
+
+
+def current_format():
+    value = os.getenv('MATH_FORMAT', '').strip().lower()
+    if value not in FORMATS:
+        raise ValueError('MATH_FORMAT must be one of: mathml, svg (got {!r})'.format(value))
+    return value
+
+
+def mathjax_script(fmt):
+    """
+    The script to append to documents rendered with `fmt`.
+    """
+    return '' if fmt else MathJaxRenderer.mathjax_src
+
+
+@contextlib.contextmanager
+def math_tokens(fmt):
+    """
+    Registers the Math span token while parsing when formulas are
+    pre-rendered. Otherwise `$...$` stays in the text for the MathJax
+    script to typeset in the browser.
+    """
+    if not fmt or Math in span_token._token_types:
+        yield
+        return
+    span_token.add_token(Math)
+    try:
+        yield
+    finally:
+        if Math in span_token._token_types:
+            span_token._token_types.remove(Math)
+
+
+class FormulaCache(HighlightCache):
+    """
+    Caches converted formulas keyed on (format, converter, display, tex);
+    identical formulas are converted once per batch, or once ever when
+    `directory` is shared.
+    """
+    def _disk_path(self, key):
+        digest = hashlib.sha1('math-{}'.format(FORMAT_VERSION).encode('utf-8'))
+        for part in key:
+            digest.update(b'\0' + str(part).encode('utf-8'))
+        return os.path.join(self.directory, digest.hexdigest() + '.html')
+
+
+formula_cache = FormulaCache(
+    maxsize=int(os.getenv('MATH_CACHE_SIZE', 4096)),
+    directory=os.getenv('MATH_CACHE_DIR'),
+)
+
+
+class FormulaError(Exception):
+    pass
+
+
+def to_mathml(tex, display):
+    try:
+        from latex2mathml.converter import convert
+    except ImportError:
+        raise RuntimeError('MATH_FORMAT=mathml requires latex2mathml (pip install latex2mathml)')
+    try:
+        return convert(tex, display='block' if display else 'inline')
+    except Exception as e:
+        raise FormulaError(str(e))
+
+
+def svg_command():
+    return shlex.split(os.getenv('MATH_SVG_COMMAND', 'tex2svg'))
+
+
+def to_svg(tex, display):
+    # '--' keeps formulas such as '-x' from being read as options
+    args = svg_command() + ([] if display else ['--inline']) + ['--', tex]
+    try:
+        result = subprocess.run(args, capture_output=True, check=True, timeout=30)
+    except FileNotFoundError:
+        raise RuntimeError('MATH_FORMAT=svg requires {} (npm install -g mathjax-node-cli, '
+                           'or set MATH_SVG_COMMAND)'.format(args[0]))
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        raise FormulaError(str(e))
+    svg = result.stdout.decode('utf-8').strip()
+    if display:
+        return '<span style="display:block;text-align:center">{}</span>'.format(svg)
+    return svg
+
+
+def converter_version(fmt):
+    if fmt == 'mathml':
+        try:
+            return metadata.version('latex2mathml')
+        except metadata.PackageNotFoundError:
+            return None
+    if fmt == 'svg':
+        return ' '.join(svg_command())
+    return None
+
+
+CONVERTERS = {'mathml': to_mathml, 'svg': to_svg}
+
+
+class StaticMathRenderer(MathJaxRenderer):
+    """
+    Converts math tokens with the converter for `math_format`; with no
+    format, behaves like MathJaxRenderer. A formula the converter rejects
+    is left as TeX source.
+    """
+    def __init__(self, *extras, math_format=None):
+        super().__init__(*extras)
+        self.math_format = current_format() if math_format is None else math_format
+        self._converter_version = converter_version(self.math_format)
+
+    @property
+    def mathjax_src(self):
+        return mathjax_script(self.math_format)
+
+    def render_inner(self, token):
+        """
+        Keeps the whitespace between text and a formula, which text
+        transforms such as pangu would strip from the text's edges.
+        """
+        children = token.children
+        if not self.math_format or not any(isinstance(child, latex_token.Math)
+                                           for child in children):
+            return super().render_inner(token)
+        rendered = []
+        for i, child in enumerate(children):
+            html = self.render(child)
+            if isinstance(child, span_token.RawText):
+                text = child.content
+                if i > 0 and isinstance(children[i - 1], latex_token.Math):
+                    lead = text[:len(text) - len(text.lstrip())]
+                    if not html.startswith(lead):
+                        html = lead + html
+                if i + 1 < len(children) and isinstance(children[i + 1], latex_token.Math):
+                    trail = text[len(text.rstrip()):]
+                    if not html.endswith(trail):
+                        html += trail
+            rendered.append(html)
+        return ''.join(rendered)
+
+    def render_math(self, token):
+        if not self.math_format:
+            return super().render_math(token)
+        content = token.content
+        display = content.startswith('$$')
+        tex = content[2:-2] if display else content[1:-1]
+        key = (self.math_format, self._converter_version, display, tex)
+        try:
+            return formula_cache.get(key, lambda: CONVERTERS[self.math_format](tex, display))
+        except FormulaError:
+            return super().render_math(token)
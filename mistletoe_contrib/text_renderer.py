@@ -1,16 +1,89 @@
+import os
+import re
+from functools import lru_cache
+
 from mistletoe import HTMLRenderer
-import emoji
-import pangu
+
+# same ranges pangu uses to decide whether a text needs spacing
+CJK = re.compile('[\u2e80-\u2eff\u2f00-\u2fdf\u3040-\u309f\u30a0-\u30fa\u30fc-\u30ff'
+                 '\u3100-\u312f\u3200-\u32ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+TAG = re.compile(r'(<[^>]*>)')
 
 
 def emojize(text):
+    import emoji
+
     return emoji.emojize(text, use_aliases=True)
 
 
+@lru_cache(maxsize=int(os.getenv('TEXT_CACHE_SIZE', 4096)))
+def _transform(text):
+    if ':' in text:
+        text = emojize(text)
+    if CJK.search(text):
+        import pangu
+
+        text = pangu.spacing_text(text)
+    return text
+
+
+def transform(text):
+    """
+    emoji aliases + pangu spacing; each step is skipped when its trigger
+    characters (':' / CJK) are absent, repeated fragments are memoized.
+    """
+    if ':' not in text and not CJK.search(text):
+        return text
+    return _transform(text)
+
+
 class TextRenderer(HTMLRenderer):
+    """
+    Args:
+        per_paragraph (bool): apply the text transforms once to each rendered
+                              paragraph's text runs instead of to every
+                              raw-text token.
+    """
+    def __init__(self, *extras, per_paragraph=bool(os.getenv('TEXT_PER_PARAGRAPH'))):
+        super().__init__(*extras)
+        self.per_paragraph = per_paragraph
+        self._deferred = False
+
+    def render_paragraph(self, token):
+        if not self.per_paragraph or self._deferred:
+            return super().render_paragraph(token)
+        self._deferred = True
+        try:
+            rendered = super().render_paragraph(token)
+        finally:
+            self._deferred = False
+        parts = TAG.split(rendered)
+        in_code = False
+        for i, part in enumerate(parts):
+            if i % 2:
+                if part.startswith(('<code', '<math', '<svg')):
+                    in_code = True
+                elif part.startswith(('</code', '</math', '</svg')):
+                    in_code = False
+            elif part and not in_code:
+                parts[i] = self._transform_run(part)
+        return ''.join(parts)
+
+    @staticmethod
+    def _transform_run(text):
+        """
+        Transforms a text run between tags, keeping the whitespace at its
+        edges (pangu strips it).
+        """
+        core = text.strip()
+        if not core:
+            return text
+        start = text.index(core)
+        return text[:start] + transform(core) + text[start + len(core):]
+
     def render_raw_text(self, token):
         text = token.content
-        parse = lambda x: pangu.spacing_text(emojize(x))
+        parse = (lambda x: x) if self._deferred else transform
         if text.startswith("[ ]"):
             text = text[3:].strip()
             rv = '<input disabled="" type="checkbox"> %s\n' % parse(text)
@@ -1,7 +1,12 @@
 """
 Table of contents support for mistletoe.
 
-See `if __name__ == '__main__'` section for sample usage.
+Headings get collision-free slug ids while the document is rendered;
+the table of contents is built from the same pass, no re-parsing needed:
+
+    with TOCRenderer() as renderer:
+        body = renderer.render(Document(text))
+        toc = renderer.render_toc()
 """
 
 import re
@@ -9,6 +14,18 @@ import re
 from mistletoe import block_token
 from mistletoe.html_renderer import HTMLRenderer
 
+_non_word = re.compile(r'[^\w\- ]+')
+
+
+def slugify(text):
+    """
+    Slug as GitHub makes it: lowercase, punctuation dropped, then every
+    space becomes a hyphen (runs are not collapsed, so "a / b" gives
+    "a--b"); CJK and other word characters are kept.
+    """
+    slug = _non_word.sub('', text.strip().lower()).replace(' ', '-')
+    return slug or 'section'
+
 
 class TOCRenderer(HTMLRenderer):
     """
@@ -24,6 +41,7 @@ class TOCRenderer(HTMLRenderer):
     def __init__(self, depth=5, omit_title=True, filter_conds=[], *extras):
         super().__init__(*extras)
         self._headings = []
+        self._slugs = set()
         self.depth = depth
         self.omit_title = omit_title
         self.filter_conds = filter_conds
@@ -31,43 +49,80 @@ class TOCRenderer(HTMLRenderer):
     @property
     def toc(self):
         """
-        Returns table of contents as a block_token.List instance.
+        Returns table of contents as a block_token.List instance;
+        see render_toc for the html with links to the heading ids.
         """
         def get_indent(level):
             if self.omit_title:
                 level -= 1
             return ' ' * 4 * (level - 1)
 
-        def build_list_item(heading):
-            level, content = heading
-            template = '{indent}- {content}\n'
-            return template.format(indent=get_indent(level), content=content)
+        lines = ['{}- {}\n'.format(get_indent(level), text)
+                 for level, text, _ in self._headings]
+        return block_token.tokenize(lines)[0]
 
-        lines = [build_list_item(heading) for heading in self._headings]
-        items = block_token.tokenize(lines)
-        return items[0]
+    def render_toc(self, headings=None):
+        """
+        Renders (level, text, id) triples, by default the headings collected
+        so far, as nested lists.
+        """
+        headings = self._headings if headings is None else headings
+        lines = []
+        levels = []
+        for level, text, anchor in headings:
+            if levels and level > levels[-1]:
+                lines.append('<ul>')
+                levels.append(level)
+            else:
+                while levels and level < levels[-1]:
+                    lines.append('</li>\n</ul>')
+                    levels.pop()
+                if levels:
+                    lines.append('</li>')
+                else:
+                    lines.append('<ul>')
+                    levels.append(level)
+            lines.append('<li>' + self.render_toc_item(text, anchor))
+        while levels:
+            lines.append('</li>\n</ul>')
+            levels.pop()
+        return '\n'.join(lines)
 
-    def _render_heading(self, token):
-        template = '<h{level} id="{id}"><a href="{href}">{inner}</a></h{level}>'
-        inner = self.render_inner(token)
-        return template.format(level=token.level, inner=inner, id=inner, href="#"+inner)
+    def render_toc_item(self, text, anchor):
+        return '<a href="#{}">{}</a>'.format(anchor, self.escape_html(text))
 
-    def render_heading(self, token):
+    def heading_id(self, text):
         """
-        Overrides super().render_heading; stores rendered heading first,
-        then returns it.
+        Returns a slug for `text` not used by any earlier heading.
         """
-        rendered = self._render_heading(token)
-        content = self.parse_rendered_heading(rendered)
-        if not (self.omit_title and token.level == 1
-                or token.level > self.depth
-                or any(cond(content) for cond in self.filter_conds)):
-            self._headings.append((token.level, content))
-        return rendered
+        base = slug = slugify(text)
+        n = 0
+        while slug in self._slugs:
+            n += 1
+            slug = '{}-{}'.format(base, n)
+        self._slugs.add(slug)
+        return slug
 
-    @staticmethod
-    def parse_rendered_heading(rendered):
+    @classmethod
+    def plain_text(cls, token):
+        """
+        Text content of a span-level token tree, markup dropped.
         """
-        Helper method; converts rendered heading to plain text.
+        if hasattr(token, 'content') and not hasattr(token, 'children'):
+            return token.content
+        return ''.join(cls.plain_text(child) for child in getattr(token, 'children', ()))
+
+    def render_heading(self, token):
         """
-        return re.sub(r'<.+?>', '', rendered)
+        Overrides super().render_heading; records the heading for the
+        table of contents, then returns it.
+        """
+        template = '<h{level} id="{id}"><a href="#{id}">{inner}</a></h{level}>'
+        text = self.plain_text(token).strip()
+        anchor = self.heading_id(text)
+        if not (self.omit_title and token.level == 1
+                or token.level > self.depth
+                or any(cond(text) for cond in self.filter_conds)):
+            self._headings.append((token.level, text, anchor))
+        inner = self.render_inner(token)
+        return template.format(level=token.level, inner=inner, id=anchor)
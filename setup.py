@@ -42,6 +42,7 @@ setup(
     long_description=long_description,  # Optional
     long_description_content_type="text/markdown",  # Optional
     install_requires=install_requires,
+    extras_require={"math": ["latex2mathml"]},
     packages=find_packages(exclude=["contrib", "docs", "tests"]),  # Required
     entry_points={"console_scripts": ["maxpress=maxpress:main"]},  # Optional
     include_package_data=True,
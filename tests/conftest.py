@@ -0,0 +1,27 @@
+import os
+import json
+import tempfile
+
+import pytest
+
+# 配置、样式表缓存都在 $HOME 下，测试使用临时目录，不读写真实的配置
+os.environ["HOME"] = tempfile.mkdtemp(prefix="maxpress-test-home-")
+
+
+@pytest.fixture
+def config():
+    """
+    写入 config.json，返回写入的配置；测试结束后恢复默认配置
+    """
+    import maxpress
+
+    def write(**overrides):
+        cfg = dict(maxpress.default_config, **overrides)
+        maxpress.prepare_dir(maxpress.config_path)
+        with open(maxpress.config_path, "w") as f:
+            json.dump(cfg, f)
+        return cfg
+
+    yield write
+    if os.path.exists(maxpress.config_path):
+        os.remove(maxpress.config_path)
@@ -0,0 +1,60 @@
+"""
+asyncio 接口的进程池和线程池模式
+"""
+import asyncio
+
+import pytest
+
+import maxpress
+from maxpress import aio
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_render_and_as_completed(config, executor):
+    config()
+    pulled = []
+
+    def documents():
+        for i in range(6):
+            pulled.append(i)
+            yield i, "第 {} 篇".format(i), "t{}".format(i)
+        yield "bad", None, ""
+
+    async def main():
+        async with aio.AsyncConverter(workers=2, max_pending=2, executor=executor) as converter:
+            html = await converter.render("你好 *世界*", "标题")
+            results = {}
+            async for key, value in converter.render_as_completed(documents(), return_exceptions=True):
+                # 只预读 max_pending 篇
+                assert len(pulled) - len(results) <= 2
+                results[key] = value
+            return html, results
+
+    html, results = asyncio.run(main())
+    assert "<em" in html and "<title>标题</title>" in html
+    assert sorted(k for k in results if k != "bad") == list(range(6))
+    assert "第 3 篇" in results[3] and "<title>t3</title>" in results[3]
+    assert isinstance(results["bad"], Exception)
+
+
+def test_errors_raise_without_return_exceptions(config):
+    config()
+
+    async def main():
+        async with aio.AsyncConverter(workers=1, executor="thread") as converter:
+            async for _ in converter.render_as_completed([("bad", None, "")]):
+                pass
+
+    with pytest.raises(Exception):
+        asyncio.run(main())
+
+
+def test_module_level_render_matches_md2html(config):
+    config()
+    html = asyncio.run(aio.render("正文", "标题"))
+    assert html == maxpress.md2html("正文", "标题")
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        aio.AsyncConverter(executor="fiber")
@@ -0,0 +1,40 @@
+"""
+批量转换时工作进程的缓存计数由主进程合并
+"""
+import functools
+
+import pytest
+
+import maxpress
+from maxpress import batch, profiling
+from mistletoe_contrib.pygments_renderer import highlight_cache
+
+
+@pytest.fixture
+def profile(monkeypatch):
+    monkeypatch.setattr(profiling, "_caches", {})
+    highlight_cache.clear()
+    hook = profiling.Profile()
+    profiling.add_hook(hook)
+    yield hook
+    profiling.remove_hook(hook)
+
+
+@pytest.mark.parametrize("threads", [False, True])
+def test_cache_counters_from_workers(tmp_path, monkeypatch, profile, threads):
+    # 每个文件一个任务块，两个工作进程
+    monkeypatch.setattr(batch, "make_chunks", functools.partial(batch.make_chunks, chunk_files=1))
+    tasks = []
+    for i in range(6):
+        path = tmp_path / "{}.md".format(i)
+        path.write_text("```python\nprint({})\n```\n".format(i % 3), encoding="utf-8")
+        tasks.append((path.name, str(path), str(tmp_path / "out"), {}))
+    config, styles = maxpress.load_config_and_css(None)
+    outputs, errors = batch.run_batch(tasks, config, styles, workers=2, threads=threads)
+    assert errors == [] and all(outputs)
+
+    caches = profile.summary()["caches"]
+    highlight = caches["highlight_cache"]
+    # 每个代码块正好经过一次高亮缓存
+    assert highlight["hits"] + highlight["disk_hits"] + highlight["misses"] == 6
+    assert highlight["misses"] >= 3
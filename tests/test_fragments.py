@@ -0,0 +1,52 @@
+"""
+块级渲染缓存与整篇渲染的结果必须相同
+"""
+from mistletoe import Document
+
+from maxpress import fragments, sections
+from maxpress.renderer import MixRender, parse_lock
+
+FILLER = "".join("段落 {} 的内容，一些填充文字。\n\n".format(i) for i in range(2000))
+
+
+def whole(text):
+    with parse_lock:
+        doc = Document(text)
+        with MixRender() as renderer:
+            return renderer.render(doc)
+
+
+def cached(text, cache):
+    with parse_lock:
+        return fragments.render(text, cache=cache)
+
+
+def test_list_followed_by_another_list_type():
+    # 列表之后隔着空行是另一种列表标记时，mistletoe 把最后一项当作松散的列表项
+    text = FILLER + "1. first\n2. second\n   ```\n   def f(): pass\n   ```\n\n- bullet\n" + FILLER
+    expected = whole(text)
+    assert "<p>first</p>" in expected
+    cache = fragments.FragmentCache()
+    assert cached(text, cache) == expected
+    # 第二次全部命中缓存
+    assert cached(text, cache) == expected
+
+
+def test_reparse_on_cache_hit_uses_plain_tokens():
+    # 缓存命中、但全文语言集合变化后需要重新渲染的块，解析时不能带上渲染器注册的 Math 等词法单元
+    text = FILLER + "> cost $x$\n>\n> ```\n> print(1)\n> ```\n\nend\n"
+    cache = fragments.FragmentCache()
+    assert cached(text, cache) == whole(text)
+    text += "\n```ruby\nputs 1\n```\n"
+    assert cached(text, cache) == whole(text)
+    assert "$$x$$" not in cached(text, cache)
+
+
+def test_section_parsed_with_next_line():
+    block = sections._lines("1. first\n2. second\n   ```\n   def f(): pass\n   ```\n\n")
+    with parse_lock:
+        doc = sections._parse(block, {}, "- bullet\n")
+        expected = Document(block + ["- bullet\n"])
+    assert expected.children[0].loose
+    assert len(doc.children) == 1
+    assert doc.children[0].loose == expected.children[0].loose
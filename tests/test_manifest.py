@@ -0,0 +1,65 @@
+"""
+convert_all 的增量构建清单
+"""
+import json
+import os
+
+import maxpress
+from maxpress.manifest import MANIFEST_NAME
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_output_collision_is_reported(tmp_path, monkeypatch, config):
+    config(auto_rename=False)
+    monkeypatch.setattr(maxpress, "ROOT", None)
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    write(src / "a.md", "top-level\n")
+    write(src / "sub" / "a.md", "nested\n")
+
+    summary = maxpress.convert_all(str(src), str(dst), archive=False, incremental=True, workers=1)
+    assert summary["rebuilt"] == 1
+    assert [path for path, _ in summary["failed"]] == [str(src / "sub" / "a.md")]
+    assert "top-level" in (dst / "a.html").read_text(encoding="utf-8")
+    with open(dst / MANIFEST_NAME, encoding="utf-8") as f:
+        assert list(json.load(f)["files"]) == ["a.md"]
+
+    # 删除冲突的文档不会删除另一篇文档的输出
+    os.remove(src / "sub" / "a.md")
+    summary = maxpress.convert_all(str(src), str(dst), archive=False, incremental=True, workers=1)
+    assert summary["removed"] == 0 and summary["failed"] == []
+    assert (dst / "a.html").is_file()
+
+
+def test_incremental_accounting(tmp_path, monkeypatch, config):
+    config()
+    monkeypatch.setattr(maxpress, "ROOT", None)
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    for name in ("a", "b", "c"):
+        write(src / (name + ".md"), name + "\n")
+
+    def build():
+        summary = maxpress.convert_all(str(src), str(dst), archive=False, incremental=True, workers=1)
+        return summary["rebuilt"], summary["skipped"], summary["removed"], len(summary["failed"])
+
+    assert build() == (3, 0, 0, 0)
+    assert build() == (0, 3, 0, 0)
+
+    # 修改一篇、删除一篇、新增一篇无法解码的文档
+    write(src / "a.md", "a changed\n")
+    os.remove(src / "b.md")
+    (src / "bad.md").write_bytes(b"\xff\xfe\xfa")
+    assert build() == (1, 1, 1, 1)
+    assert not (dst / "b.html").exists()
+    assert "a changed" in (dst / "a.html").read_text(encoding="utf-8")
+
+    # 失败的文档不记入清单，下次重新尝试
+    assert build() == (0, 2, 0, 1)
+    os.remove(src / "bad.md")
+
+    # 配置变化后全部重新生成
+    config(theme_color="#abcde3")
+    assert build() == (2, 0, 0, 0)
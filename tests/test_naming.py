@@ -0,0 +1,88 @@
+"""
+auto_rename 的输出命名与原子写入
+"""
+import os
+import threading
+
+import pytest
+
+import maxpress
+from maxpress import naming
+from maxpress.naming import OutputNamer, move_atomic, numbered, write_atomic
+
+
+def test_numbered():
+    assert numbered("dst/a.html", 0) == "dst/a.html"
+    assert numbered("dst/a.html", 2) == "dst/a(2).html"
+    assert numbered("dst/README", 1) == "dst/README(1)"
+
+
+def test_namer_skips_existing_and_assigned(tmp_path):
+    (tmp_path / "a.html").write_text("")
+    (tmp_path / "a(1).html").write_text("")
+    namer = OutputNamer()
+    path = str(tmp_path / "a.html")
+    assert namer.assign(path) == str(tmp_path / "a(2).html")
+    # 同一批次内已分配的名字不再分配，即使文件还没有写入
+    assert namer.assign(path) == str(tmp_path / "a(3).html")
+    assert namer.assign(str(tmp_path / "b.html")) == str(tmp_path / "b.html")
+
+
+def test_namer_threads_get_distinct_names(tmp_path):
+    namer = OutputNamer()
+    names = []
+    threads = [
+        threading.Thread(target=lambda: names.append(namer.assign(str(tmp_path / "a.html"))))
+        for _ in range(16)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(names)) == 16
+
+
+def test_write_atomic_replaces_and_cleans_up(tmp_path):
+    path = str(tmp_path / "out" / "a.html")
+    write_atomic(path, "old")
+    write_atomic(path, "new")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "new"
+    # 写入失败时保留原来的文件，不留下临时文件
+    with pytest.raises(TypeError):
+        write_atomic(path, b"not text")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "new"
+    assert os.listdir(tmp_path / "out") == ["a.html"]
+
+
+def test_move_atomic_across_filesystems(tmp_path, monkeypatch):
+    src = tmp_path / "a.md"
+    src.write_text("正文", encoding="utf-8")
+
+    def cross_device(a, b):
+        raise OSError(18, "Invalid cross-device link")
+
+    monkeypatch.setattr(naming.os, "rename", cross_device)
+    dst = tmp_path / "archive" / "a.md"
+    move_atomic(str(src), str(dst))
+    assert not src.exists()
+    assert dst.read_text(encoding="utf-8") == "正文"
+    assert os.listdir(tmp_path / "archive") == ["a.md"]
+
+
+def test_convert_all_numbers_in_path_order(tmp_path, monkeypatch, config):
+    config(auto_rename=True)
+    monkeypatch.setattr(maxpress, "ROOT", None)
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    (src / "sub").mkdir(parents=True)
+    dst.mkdir()
+    (dst / "a.html").write_text("earlier run")
+    (src / "a.md").write_text("top-level\n", encoding="utf-8")
+    (src / "sub" / "a.md").write_text("nested\n", encoding="utf-8")
+
+    summary = maxpress.convert_all(str(src), str(dst), archive=False, workers=2)
+    assert summary["rebuilt"] == 2
+    assert (dst / "a.html").read_text() == "earlier run"
+    assert "top-level" in (dst / "a(1).html").read_text(encoding="utf-8")
+    assert "nested" in (dst / "a(2).html").read_text(encoding="utf-8")
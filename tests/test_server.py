@@ -0,0 +1,99 @@
+"""
+用本地客户端请求 maxpress serve
+"""
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from maxpress import server as render_server
+
+
+def failing_render(doc):
+    raise ValueError("broken renderer")
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start():
+        server = render_server.RenderServer(("127.0.0.1", 0), workers=1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return "http://127.0.0.1:{}".format(server.server_address[1])
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def request(url, body=None, content_type="application/json"):
+    if body is not None and not isinstance(body, bytes):
+        body = body.encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            return response.status, response.headers, response.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read().decode("utf-8")
+
+
+def test_render_and_batch(serve):
+    base = serve()
+    status, headers, html = request(base + "/render", json.dumps({"markdown": "你好 *世界*", "title": "t"}))
+    assert status == 200
+    assert headers["Content-Type"].startswith("text/html")
+    assert float(headers["X-Render-Time"]) >= 0
+    assert "<em" in html and "<title>t</title>" in html
+
+    status, _, html = request(base + "/render?title=raw", "# 标题", content_type="text/markdown")
+    assert status == 200 and "<title>raw</title>" in html
+
+    docs = [{"id": 1, "markdown": "a"}, {"id": "b", "markdown": "b", "title": "B"}]
+    status, _, body = request(base + "/batch", json.dumps({"documents": docs}))
+    assert status == 200
+    results = json.loads(body)["results"]
+    assert [r["id"] for r in results] == [1, "b"]
+    assert all("html" in r for r in results)
+
+    assert request(base + "/health")[0] == 200
+    assert request(base + "/other", "{}")[0] == 404
+
+
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/render", "{not json"),
+        ("/render", "[]"),
+        ("/render", '"x"'),
+        ("/render", '{"markdown": 1}'),
+        ("/render", '{"markdown": "a", "title": []}'),
+        ("/batch", "[]"),
+        ("/batch", '"x"'),
+        ("/batch", '{"documents": "x"}'),
+        ("/batch", '{"documents": [1]}'),
+        ("/batch", '{"documents": [{"markdown": null}]}'),
+    ],
+)
+def test_bad_requests(serve, path, body):
+    status, _, text = request(serve() + path, body)
+    assert status == 400
+    assert "error" in json.loads(text)
+
+
+def test_render_errors_are_server_errors(serve, monkeypatch):
+    # 工作进程由 fork 创建，沿用替换后的渲染函数
+    monkeypatch.setattr(render_server, "_init_worker", lambda styles: None)
+    monkeypatch.setattr(render_server, "render_document", failing_render)
+    base = serve()
+    status, _, text = request(base + "/render", json.dumps({"markdown": "a"}))
+    assert status == 500
+    assert "broken renderer" in json.loads(text)["error"]
+
+    status, _, text = request(base + "/batch", json.dumps({"documents": [{"id": 1, "markdown": "a"}]}))
+    assert status == 200
+    assert "broken renderer" in json.loads(text)["results"][0]["error"]
@@ -0,0 +1,87 @@
+"""
+convert_all 输出到 zip、tar、SQLite
+"""
+import sqlite3
+import tarfile
+import zipfile
+
+import pytest
+
+import maxpress
+from maxpress.sinks import SinkWriter, open_sink
+
+
+@pytest.fixture
+def src(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "a.md").write_text("第一篇\n", encoding="utf-8")
+    (src / "sub" / "b.md").write_text("第二篇\n", encoding="utf-8")
+    return src
+
+
+def convert(src, dst, archive=False):
+    summary = maxpress.convert_all(str(src), str(dst), archive=archive, workers=2)
+    assert summary["failed"] == [] and summary["rebuilt"] == 2
+
+
+def test_zip(src, tmp_path, config):
+    config()
+    dst = tmp_path / "out.zip"
+    convert(src, dst)
+    with zipfile.ZipFile(dst) as z:
+        assert sorted(z.namelist()) == ["html/a.html", "html/sub/b.html"]
+        assert "第二篇" in z.read("html/sub/b.html").decode("utf-8")
+
+
+@pytest.mark.parametrize("name", ["out.tar", "out.tar.gz"])
+def test_tar_with_archive(src, tmp_path, config, name):
+    config()
+    dst = tmp_path / name
+    convert(src, dst, archive=True)
+    with tarfile.open(dst) as t:
+        names = sorted(t.getnames())
+        assert names == ["archive/a.md", "archive/sub/b.md", "html/a.html", "html/sub/b.html"]
+        assert t.extractfile("archive/sub/b.md").read().decode("utf-8") == "第二篇\n"
+    # 写入输出目标后才删除源文档
+    assert not (src / "a.md").exists() and not (src / "sub" / "b.md").exists()
+
+
+def test_sqlite_replaces_rows(src, tmp_path, config):
+    config()
+    dst = tmp_path / "out.sqlite"
+    convert(src, dst)
+    (src / "a.md").write_text("修改后\n", encoding="utf-8")
+    convert(src, dst)
+    db = sqlite3.connect(str(dst))
+    try:
+        rows = dict(db.execute("SELECT path, html FROM documents"))
+    finally:
+        db.close()
+    assert sorted(rows) == ["a.md", "sub/b.md"]
+    assert "修改后" in rows["a.md"]
+
+
+def test_open_sink_by_extension(tmp_path):
+    assert open_sink(str(tmp_path / "dir")) is None
+    assert type(open_sink("x.ZIP")).__name__ == "ZipSink"
+    assert open_sink("x.tgz").mode == "w:gz"
+    assert type(open_sink("x.db")).__name__ == "SqliteSink"
+
+
+def test_writer_collects_errors(tmp_path):
+    class Broken:
+        def locate(self, key, archive=False):
+            return key
+
+        def write(self, key, html):
+            raise OSError("disk full")
+
+        def close(self):
+            pass
+
+    writer = SinkWriter(Broken())
+    assert writer.put("a.md", "<p></p>", "/src/a.md") == "a.md"
+    errors = writer.close()
+    assert [path for path, _ in errors] == ["/src/a.md"]
+    assert "disk full" in errors[0][1]
@@ -0,0 +1,68 @@
+"""
+MATH_FORMAT 静态公式：哪些 $ 算作公式，公式两侧的空格
+"""
+import re
+import sys
+
+import pytest
+
+import maxpress
+
+
+@pytest.fixture
+def render(monkeypatch):
+    pytest.importorskip("latex2mathml")
+    monkeypatch.setenv("MATH_FORMAT", "mathml")
+
+    def render(text):
+        html = maxpress.md2html(text, styles=[])
+        body = re.search(r"<p[^>]*>(.*?)</p>", html, re.S).group(1)
+        return re.sub(r"<math.*?</math>", "<M>", body, flags=re.S)
+
+    return render
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("价格在 $5 和 $6 之间", "价格在 $5 和 $6 之间"),
+        ("costs $5, or $x$", "costs $5, or <M>"),
+        ("$x$5 and $ y $", "$x$5 and $ y $"),
+        ("English $x+1$ text", "English <M> text"),
+        ("$$a b$$", "<M>"),
+    ],
+)
+def test_formula_spans(render, text, expected):
+    assert render(text) == expected
+
+
+def test_spacing_around_formula_in_cjk_text(render):
+    assert render("中文 $x$ 中文") == "中文 <M> 中文"
+    assert render("中文$x$中文") == "中文<M>中文"
+
+
+# 代替 tex2svg：以 - 开头、又不在 -- 之后的参数当作选项，未知选项报错
+SVG_STUB = """
+import sys
+args = sys.argv[1:]
+inline = False
+while args and args[0].startswith("-"):
+    option = args.pop(0)
+    if option == "--":
+        break
+    if option != "--inline":
+        sys.exit("unknown option " + option)
+    inline = True
+print('<svg data-inline="{}">{}</svg>'.format(inline, " ".join(args)))
+"""
+
+
+def test_svg_formulas_after_double_dash(tmp_path, monkeypatch):
+    stub = tmp_path / "tex2svg.py"
+    stub.write_text(SVG_STUB, encoding="utf-8")
+    monkeypatch.setenv("MATH_FORMAT", "svg")
+    monkeypatch.setenv("MATH_SVG_COMMAND", "{} {}".format(sys.executable, stub))
+    html = maxpress.md2html("负数 $-x$ 与 $-\\frac12$\n\n$$-y$$\n", styles=[])
+    assert '<svg data-inline="True">-x</svg>' in html
+    assert '<svg data-inline="True">-\\frac12</svg>' in html
+    assert '<svg data-inline="False">-y</svg>' in html
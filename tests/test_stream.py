@@ -0,0 +1,40 @@
+"""
+maxpress stream：NDJSON 输入输出
+"""
+import io
+import json
+
+import pytest
+
+from maxpress import stream
+
+LINES = [
+    json.dumps({"id": 1, "title": "一", "markdown": "第一篇"}),
+    "",
+    "{not json",
+    json.dumps([1, 2]),
+    json.dumps({"id": "x", "markdown": 3}),
+    json.dumps({"id": "y", "markdown": "a", "config": {"theme_color": "#000"}}),
+    json.dumps({"id": 2, "markdown": "第二篇", "config": {"banner_url": "http://example.com/b.png"}}),
+]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_results_and_error_records(config, workers):
+    config()
+    output = io.StringIO()
+    written, failed = stream.run_stream(
+        io.StringIO("\n".join(LINES) + "\n"), output, workers=workers, max_pending=2
+    )
+    assert (written, failed) == (6, 4)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    by_line = {r["line"]: r for r in results if "error" in r}
+    html = {r["id"]: r["html"] for r in results if "html" in r}
+
+    assert "第一篇" in html[1] and "<title>一</title>" in html[1]
+    assert "http://example.com/b.png" in html[2]
+    assert by_line[3]["id"] is None and by_line[3]["error"]["type"] == "JSONDecodeError"
+    assert by_line[4]["error"] == {"type": "TypeError", "message": "record must be a JSON object"}
+    assert by_line[5]["id"] == "x" and by_line[5]["error"]["type"] == "TypeError"
+    assert by_line[6]["error"]["type"] == "ValueError"
+    assert "theme_color" in by_line[6]["error"]["message"]
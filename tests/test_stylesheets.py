@@ -0,0 +1,158 @@
+"""
+StylesheetLoader 对本地 HTTP 服务的请求：条件请求验证、离线模式、批次内只请求一次
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import maxpress
+from maxpress import stylesheets
+from maxpress.inliner import Inliner
+from maxpress.stylesheets import StylesheetLoader, StylesheetUnavailable
+
+
+class StandIn:
+    """
+    提供 /style.css 的本地服务，记录收到的请求；etag 或 last_modified 匹配时返回 304
+    """
+
+    def __init__(self):
+        self.body = b"p { color: #123456; }"
+        self.etag = '"v1"'
+        self.last_modified = None
+        self.requests = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.requests.append(dict(self.headers))
+                if self.path != "/style.css":
+                    self.send_error(404)
+                    return
+                inm = self.headers.get("If-None-Match")
+                ims = self.headers.get("If-Modified-Since")
+                if (stand_in.etag and inm == stand_in.etag) or (
+                    stand_in.last_modified and ims == stand_in.last_modified
+                ):
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/css; charset=utf-8")
+                self.send_header("Content-Length", str(len(stand_in.body)))
+                if stand_in.etag:
+                    self.send_header("ETag", stand_in.etag)
+                if stand_in.last_modified:
+                    self.send_header("Last-Modified", stand_in.last_modified)
+                self.end_headers()
+                self.wfile.write(stand_in.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}/style.css".format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    server = StandIn()
+    yield server
+    server.close()
+
+
+def test_etag_revalidation(stand_in, tmp_path):
+    first = StylesheetLoader(str(tmp_path))
+    assert first.load(stand_in.url) == stand_in.body.decode()
+
+    # 新的批次：带 If-None-Match 重新验证，304 时使用缓存
+    second = StylesheetLoader(str(tmp_path))
+    assert second.load(stand_in.url) == stand_in.body.decode()
+    assert len(stand_in.requests) == 2
+    assert stand_in.requests[1].get("If-None-Match") == '"v1"'
+
+    # 内容变化后下载新版本
+    stand_in.body, stand_in.etag = b"p { color: #654321; }", '"v2"'
+    third = StylesheetLoader(str(tmp_path))
+    assert third.load(stand_in.url) == "p { color: #654321; }"
+
+
+def test_last_modified_revalidation(stand_in, tmp_path):
+    stand_in.etag = None
+    stand_in.last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+    StylesheetLoader(str(tmp_path)).load(stand_in.url)
+    StylesheetLoader(str(tmp_path)).load(stand_in.url)
+    assert stand_in.requests[1].get("If-Modified-Since") == stand_in.last_modified
+
+
+def test_offline(stand_in, tmp_path):
+    offline = StylesheetLoader(str(tmp_path), offline=True)
+    with pytest.raises(StylesheetUnavailable):
+        offline.load(stand_in.url)
+    assert stand_in.requests == []
+
+    StylesheetLoader(str(tmp_path)).load(stand_in.url)
+    offline = StylesheetLoader(str(tmp_path), offline=True)
+    assert offline.load(stand_in.url) == stand_in.body.decode()
+    assert len(stand_in.requests) == 1
+
+
+def test_cached_copy_when_server_fails(stand_in, tmp_path):
+    StylesheetLoader(str(tmp_path)).load(stand_in.url)
+    stand_in.close()
+    assert StylesheetLoader(str(tmp_path), timeout=1).load(stand_in.url) == stand_in.body.decode()
+
+
+def test_fetched_once_per_batch(stand_in, tmp_path, monkeypatch):
+    loader = StylesheetLoader(str(tmp_path))
+    monkeypatch.setattr(stylesheets, "_loader", loader)
+
+    threads = [threading.Thread(target=loader.load, args=(stand_in.url,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 多篇文档、多个内联器都经由同一个加载器
+    for i in range(3):
+        html = maxpress.md2html("段落 {}".format(i), styles=[stand_in.url], inliner=Inliner())
+        assert "#123456" in html
+    assert len(stand_in.requests) == 1
+
+    # 下一批次重新验证一次
+    stylesheets.reset_loader()
+    loader.load(stand_in.url)
+    assert len(stand_in.requests) == 2
+
+
+def test_spawned_workers_reuse_prefetched(stand_in, tmp_path, monkeypatch):
+    # macOS 默认以 spawn 创建工作进程，不继承主进程的加载器
+    import functools
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    from maxpress import batch
+
+    monkeypatch.setattr(
+        batch,
+        "ProcessPoolExecutor",
+        functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn")),
+    )
+    monkeypatch.setattr(batch, "make_chunks", functools.partial(batch.make_chunks, chunk_files=1))
+    stylesheets.reset_loader()
+    tasks = []
+    for i in range(4):
+        path = tmp_path / "{}.md".format(i)
+        path.write_text("段落 {}\n".format(i), encoding="utf-8")
+        tasks.append((path.name, str(path), str(tmp_path / "out"), {}))
+    config, styles = maxpress.load_config_and_css(None)
+    outputs, errors = batch.run_batch(tasks, config, styles + [stand_in.url], workers=2)
+    assert errors == [] and all(outputs)
+    assert "#123456" in open(outputs[0], encoding="utf-8").read()
+    assert len(stand_in.requests) == 1
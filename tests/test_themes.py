@@ -0,0 +1,45 @@
+import maxpress
+from maxpress import stream
+from maxpress.converter import Converter
+
+FRONT_MATTER = "---\ntheme: account-a\nslot: front-matter-value\n---\n正文段落\n"
+
+
+def test_md2html_uses_config_variables(config):
+    config(theme_color="#abcdef")
+    html = maxpress.md2html("# 标题\n\n正文")
+    assert "#abcdef" in html
+
+
+def test_front_matter_is_not_rendered(config):
+    cfg = config()
+    styles = [maxpress.cached_css(cfg)]
+    stream._init_worker(None)
+    outputs = [
+        stream.render_record({"markdown": FRONT_MATTER}),
+        maxpress.md2html(FRONT_MATTER),
+        maxpress.convert_markdown(FRONT_MATTER, "t", cfg, styles),
+        Converter(styles, cfg).render(FRONT_MATTER, "t"),
+    ]
+    for html in outputs:
+        assert "正文段落" in html
+        assert "front-matter-value" not in html
+        assert "<hr" not in html
+
+
+def test_default_stylesheet_resolved_once(config, capsys, monkeypatch):
+    config(theme_color="#abcde1")
+    maxpress.md2html("# 标题\n\n正文")
+    capsys.readouterr()
+    reads = []
+    read_config = maxpress.read_config
+    monkeypatch.setattr(maxpress, "read_config", lambda *a: reads.append(a) or read_config(*a))
+    for _ in range(3):
+        assert "#abcde1" in maxpress.md2html("# 标题\n\n正文")
+    assert reads == []
+    assert capsys.readouterr().err == ""
+
+    # 配置变化后重新解析
+    config(theme_color="#abcde2")
+    assert "#abcde2" in maxpress.md2html("# 标题\n\n正文")
+    assert len(reads) == 1
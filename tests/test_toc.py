@@ -0,0 +1,28 @@
+"""
+标题 id 与目录
+"""
+from mistletoe import Document, block_token
+
+from mistletoe_contrib.toc_renderer import TOCRenderer, slugify
+
+
+def test_slugify_matches_github():
+    assert slugify("a / b") == "a--b"
+    assert slugify("Hello, World!") == "hello-world"
+    assert slugify("C++ & Rust") == "c--rust"
+    assert slugify("数学运算 & 绘图") == "数学运算--绘图"
+    assert slugify("snake_case-name") == "snake_case-name"
+    assert slugify("!!!") == "section"
+
+
+def test_toc_token_and_html():
+    text = "# Title\n\n## One\n\n### Sub\n\n## One\n"
+    with TOCRenderer() as renderer:
+        body = renderer.render(Document(text))
+        toc = renderer.toc
+        assert isinstance(toc, block_token.List)
+        assert "<li>One" in renderer.render(toc)
+        html = renderer.render_toc()
+    assert 'id="one"' in body and 'id="one-1"' in body
+    assert '<a href="#sub">Sub</a>' in html
+    assert '<a href="#one-1">One</a>' in html
@@ -0,0 +1,70 @@
+import os
+
+import maxpress
+import maxpress.watch
+
+
+def test_watch_all_overwrites_output(tmp_path, monkeypatch, config):
+    config(auto_rename=True)
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    path = src / "a.md"
+    path.write_text("version-a\n", encoding="utf-8")
+
+    def watch(paths, on_change):
+        for text in ("version-b\n", "version-c\n"):
+            path.write_text(text, encoding="utf-8")
+            on_change({str(path)})
+
+    monkeypatch.setattr(maxpress.watch, "watch", watch)
+    maxpress.watch_all(str(src), str(dst))
+    assert [f for f in os.listdir(dst) if f.endswith(".html")] == ["a.html"]
+    assert "version-c" in (dst / "a.html").read_text(encoding="utf-8")
+
+
+def test_watch_all_rebuild_overwrites_output(tmp_path, monkeypatch, config):
+    config(auto_rename=True)
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    (src / "a.md").write_text("正文\n", encoding="utf-8")
+
+    def watch(paths, on_change):
+        # 两次保存配置文件，每次都全部重新生成
+        for color in ("#111111", "#222222"):
+            config(auto_rename=True, theme_color=color)
+            on_change({maxpress.config_path})
+
+    monkeypatch.setattr(maxpress.watch, "watch", watch)
+    maxpress.watch_all(str(src), str(dst))
+    assert [f for f in os.listdir(dst) if f.endswith(".html")] == ["a.html"]
+
+
+def test_watch_file_uses_themes(tmp_path, monkeypatch, config):
+    from maxpress import themes
+
+    config()
+    theme_path = os.path.join(themes.THEMES_DIR, "watched.json")
+    maxpress.prepare_dir(theme_path)
+    with open(theme_path, "w") as f:
+        f.write('{"banner_url": "http://example.com/banner-1.png"}')
+    path = tmp_path / "a.md"
+    path.write_text("---\ntheme: watched\n---\n正文\n", encoding="utf-8")
+    dst = tmp_path / "dst"
+    seen = {}
+
+    def watch(paths, on_change):
+        seen["paths"] = paths
+        seen["first"] = (dst / "a.html").read_text(encoding="utf-8")
+        # 修改主题文件后重新转换
+        with open(theme_path, "w") as f:
+            f.write('{"banner_url": "http://example.com/banner-2.png"}')
+        on_change({theme_path})
+
+    monkeypatch.setattr(maxpress.watch, "watch", watch)
+    try:
+        maxpress.watch_file(str(path), str(dst))
+    finally:
+        os.remove(theme_path)
+    assert "banner-1.png" in seen["first"]
+    assert "banner-2.png" in (dst / "a.html").read_text(encoding="utf-8")
+    assert themes.THEMES_DIR in seen["paths"]